@@ -0,0 +1,113 @@
+"""
+Асинхронный путь чтения для запуска под ASGI.
+
+В Django 3.2 нет асинхронного ORM, а синхронные обработчики под ASGI
+выполняются по одному в общем потоке. Асинхронные варианты горячих
+эндпоинтов (async_view) отдают синхронный обработчик DRF целиком
+в ограниченный пул потоков: одновременно к БД обращается не больше
+THREADS запросов, а медленные клиенты занимают только цикл событий.
+
+Обёртки execute, которые ставят middleware (метрики, поиск N+1,
+журнал медленных запросов), хранятся в контексте запроса. Каждое
+соединение при открытии получает диспетчер, который вызывает обёртки
+из текущего контекста, — поэтому запросы считаются в любом потоке:
+в пуле, в потоке sync_to_async и в обычном WSGI-воркере.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import close_old_connections
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THREADS': 8,
+}
+
+request_db_wrappers = ContextVar('request_db_wrappers', default=())
+
+_executor = None
+
+
+def get_setting(name):
+    return getattr(settings, 'ASYNC_READS', {}).get(name, DEFAULTS[name])
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            get_setting('THREADS'), thread_name_prefix='db'
+        )
+    return _executor
+
+
+def dispatch_wrappers(execute, sql, params, many, context):
+    # Порядок как у вложенных connection.execute_wrapper:
+    # поставленная позже обёртка — внешняя.
+    for wrapper in request_db_wrappers.get():
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install_dispatcher(sender, connection, **kwargs):
+    """
+    Обработчик connection_created. Диспетчер ставится первым, чтобы
+    не мешать connection.execute_wrapper, который снимает последнюю
+    обёртку списка.
+    """
+    if dispatch_wrappers not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, dispatch_wrappers)
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """
+    Обёртка execute для всех SQL-запросов текущего HTTP-запроса,
+    в каком бы потоке они ни выполнялись.
+    """
+    token = request_db_wrappers.set(request_db_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        request_db_wrappers.reset(token)
+
+
+def _call(func, args, kwargs):
+    # Поток пула живёт долго: соединения закрываются и проверяются
+    # так же, как по сигналам начала и конца запроса.
+    close_old_connections()
+    try:
+        response = func(*args, **kwargs)
+        if not getattr(response, 'is_rendered', True):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """
+    Выполнить синхронную функцию в пуле с контекстом текущего запроса.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor(), copy_context().run, _call, func, args, kwargs
+    )
+
+
+def async_view(viewset, actions, **initkwargs):
+    """
+    Асинхронный вариант view вьюсета: тот же код DRF, выполненный
+    в пуле потоков.
+    """
+    view = viewset.as_view(actions, **initkwargs)
+
+    @wraps(view)
+    async def view_async(request, *args, **kwargs):
+        return await run_in_pool(view, request, *args, **kwargs)
+
+    return view_async
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from .aio import install_dispatcher
+        from .throttling import check_throttle_costs
+        connection_created.connect(
+            install_dispatcher, dispatch_uid='api.aio.install_dispatcher'
+        )
+        checks.register(check_throttle_costs)
@@ -0,0 +1,109 @@
+"""
+Пакетные запросы: POST /api/batch/ выполняет несколько GET-запросов
+к API внутри одного HTTP-запроса.
+
+Подзапросы идут по очереди в том же потоке и с тем же соединением
+с БД, что и пакет, с уже проверенным пользователем пакета — токен
+не проверяется заново. Ошибка подзапроса — его статус в ответе,
+остальные подзапросы выполняются как обычно.
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+DEFAULTS = {
+    'MAX_REQUESTS': 10,
+    'VIEWSETS': (
+        'RecipeViewSet',
+        'UserViewSet',
+        'IngredientViewSet',
+    ),
+}
+
+logger = logging.getLogger('api.batch')
+
+
+def get_setting(name):
+    return getattr(settings, 'BATCH_REQUESTS', {}).get(name, DEFAULTS[name])
+
+
+def error(status, detail):
+    return {'status': status, 'body': {'detail': detail}}
+
+
+def sub_request(request, url):
+    """
+    GET-запрос к url с заголовками и пользователем пакета.
+    """
+    parts = urlsplit(url)
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = parts.path
+    sub.META = {
+        **request.META,
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_LENGTH': '0',
+    }
+    sub.META.pop('CONTENT_TYPE', None)
+    sub.GET = QueryDict(parts.query)
+    if request.user.is_authenticated:
+        # Пользователь уже опознан пакетом: DRF возьмёт его без
+        # повторной проверки токена.
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+    return sub
+
+
+def resolve_view(path):
+    """
+    Обработчик разрешённого вьюсета для path или None.
+    """
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    view = match.func
+    viewset = getattr(view, 'cls', None)
+    if viewset is None or viewset.__name__ not in get_setting('VIEWSETS'):
+        return None
+    if asyncio.iscoroutinefunction(view):
+        # Асинхронный вариант (api.aio.async_view) — здесь нужен
+        # синхронный обработчик, который он оборачивает.
+        view = view.__wrapped__
+    return view, match.args, match.kwargs
+
+
+def run_one(request, url):
+    path = urlsplit(url).path
+    if not path.startswith('/api/'):
+        return error(400, 'Поддерживаются только адреса /api/.')
+    resolved = resolve_view(path)
+    if resolved is None:
+        return error(404, 'Адрес не поддерживается в пакетном запросе.')
+    view, args, kwargs = resolved
+    try:
+        response = view(sub_request(request, url), *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Http404:
+        return error(404, 'Страница не найдена.')
+    except Exception:
+        logger.exception('Ошибка подзапроса %s', url)
+        return error(500, 'Ошибка сервера.')
+    try:
+        body = json.loads(response.content) if response.content else None
+    except ValueError:
+        body = response.content.decode(errors='replace')
+    return {'status': response.status_code, 'body': body}
+
+
+def run(request, items):
+    return [run_one(request, item['url']) for item in items]
@@ -0,0 +1,78 @@
+"""
+Чтение с реплик и запись в основную БД.
+
+ReplicaRoutingMiddleware решает для каждого запроса, можно ли читать
+с реплики: только безопасные запросы API и только если пользователь
+недавно ничего не менял. После успешной записи пользователь на
+PIN_SECONDS закрепляется за основной БД — так он сразу видит свои
+изменения, даже если реплика отстаёт.
+
+Вне HTTP-запросов (команды, миграции, shell) всё идёт в основную БД.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import hashlib
+import random
+
+from django.conf import settings
+
+DEFAULTS = {
+    'PIN_SECONDS': 5,
+    'PATHS': ('/api/',),
+    # POST-запросы, которые только читают (пакетные GET-запросы).
+    'READ_ONLY_PATHS': ('/api/batch/',),
+}
+
+PRIMARY = 'default'
+
+read_from_primary = ContextVar('read_from_primary', default=True)
+
+
+def get_setting(name):
+    return getattr(settings, 'REPLICA_ROUTING', {}).get(name, DEFAULTS[name])
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def use_primary():
+    """
+    Читать из основной БД внутри блока, например для кэшей,
+    которые не должны собираться по отстающей реплике.
+    """
+    token = read_from_primary.set(True)
+    try:
+        yield
+    finally:
+        read_from_primary.reset(token)
+
+
+def pin_key(request):
+    """
+    Ключ закрепления за основной БД: по токену или сессии, без
+    обращений к БД. У анонимного пользователя ключа нет.
+    """
+    identity = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not identity:
+        return None
+    return 'db-pin:' + hashlib.sha1(identity.encode()).hexdigest()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if read_from_primary.get() or not aliases:
+            return PRIMARY
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД.
+        return True
@@ -0,0 +1,158 @@
+"""
+Предельное время обработки запроса API.
+
+Срок обработчика — deadline_ms вьюсета: число миллисекунд либо
+словарь {action: число}, как query_budget; переопределения —
+REQUEST_DEADLINES['VIEWS'] {'RecipeViewSet.list': 2000}, остальным
+вьюсетам — DEFAULT_MS; админка и прочие представления Django
+без срока. Отсчёт идёт от начала запроса.
+
+DeadlineMiddleware проверяет срок перед каждым SQL-запросом и
+ограничивает время самого запроса оставшимся сроком: в PostgreSQL —
+statement_timeout соединения (остаток округляется вверх до четверти
+срока, и SET выполняется, только когда значение меняется), в SQLite —
+обработчиком прогресса. Когда срок вышел, клиент
+получает 503 и запрос считается в request_deadline_exceeded_total:
+воркер и соединение с БД освобождаются, а не ждут до конца.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .metrics import registry, view_label
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DEFAULT_MS': 10000,
+    'VIEWS': {},
+}
+
+# Код ошибки PostgreSQL query_canceled (в т. ч. по statement_timeout).
+QUERY_CANCELED = '57014'
+# Как часто SQLite вызывает обработчик прогресса, в инструкциях VM.
+SQLITE_PROGRESS_STEPS = 10000
+# На сколько ступеней делится срок для statement_timeout.
+STATEMENT_TIMEOUT_STEPS = 4
+
+
+def get_setting(name):
+    return getattr(settings, 'REQUEST_DEADLINES', {}).get(
+        name, DEFAULTS[name]
+    )
+
+
+class DeadlineExceeded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите запрос позже.'
+    default_code = 'deadline_exceeded'
+
+
+def view_deadline(view_func, label, method):
+    """
+    Срок обработчика в миллисекундах или None — без ограничения.
+    """
+    overrides = get_setting('VIEWS')
+    if label in overrides:
+        return overrides[label]
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return None
+    deadline = getattr(cls, 'deadline_ms', None)
+    if isinstance(deadline, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        deadline = deadline.get(actions.get(method.lower()))
+    return deadline if deadline is not None else get_setting('DEFAULT_MS')
+
+
+def statement_timeout_ms(deadline_ms, remaining_ms):
+    """
+    Остаток срока, округлённый вверх до ступени в 1/STATEMENT_TIMEOUT_STEPS
+    срока: запрос не переживает срок больше чем на ступень, а значение
+    меняется не чаще STATEMENT_TIMEOUT_STEPS раз за запрос.
+    """
+    step = deadline_ms / STATEMENT_TIMEOUT_STEPS
+    return min(math.ceil(math.ceil(remaining_ms / step) * step), deadline_ms)
+
+
+def _set_statement_timeout(connection, timeout_ms):
+    """
+    statement_timeout соединения PostgreSQL. Значение сессии
+    запоминается вместе с самим соединением, новое соединение
+    начинает с нуля. Внутри transaction.atomic() выполняется
+    SET LOCAL без запоминания: откат транзакции вернул бы значение,
+    а запомненное осталось бы прежним.
+    """
+    raw = connection.connection
+    known_raw, known_ms = getattr(connection, '_statement_timeout', (None, 0))
+    if known_raw is not raw:
+        known_ms = 0
+    if known_ms == timeout_ms:
+        return
+    with raw.cursor() as cursor:
+        if connection.in_atomic_block:
+            cursor.execute('SET LOCAL statement_timeout = %s', [timeout_ms])
+            return
+        cursor.execute('SET statement_timeout = %s', [timeout_ms])
+    connection._statement_timeout = (raw, timeout_ms)
+
+
+class RequestDeadline:
+    """
+    execute_wrapper на время запроса. Срок берётся из
+    request.deadline_ms, который выставляет process_view.
+    """
+
+    def __init__(self, request, started):
+        self.request = request
+        self.started = started
+
+    def remaining_ms(self):
+        deadline = getattr(self.request, 'deadline_ms', None)
+        if deadline is None:
+            return None
+        return deadline - (time.monotonic() - self.started) * 1000
+
+    def exceeded(self):
+        registry.inc(
+            'request_deadline_exceeded_total',
+            {'view': view_label(self.request)}
+        )
+        return DeadlineExceeded()
+
+    def __call__(self, execute, sql, params, many, context):
+        remaining = self.remaining_ms()
+        if remaining is not None and remaining <= 0:
+            raise self.exceeded()
+        connection = context['connection']
+        if connection.vendor == 'postgresql':
+            _set_statement_timeout(
+                connection,
+                0 if remaining is None else statement_timeout_ms(
+                    self.request.deadline_ms, remaining
+                )
+            )
+            try:
+                return execute(sql, params, many, context)
+            except OperationalError as exc:
+                if getattr(exc.__cause__, 'pgcode', None) == QUERY_CANCELED:
+                    raise self.exceeded() from exc
+                raise
+        if connection.vendor == 'sqlite' and remaining is not None:
+            stop = time.monotonic() + remaining / 1000
+            raw = connection.connection
+            raw.set_progress_handler(
+                lambda: time.monotonic() > stop, SQLITE_PROGRESS_STEPS
+            )
+            try:
+                return execute(sql, params, many, context)
+            except OperationalError as exc:
+                if str(exc) == 'interrupted':
+                    raise self.exceeded() from exc
+                raise
+            finally:
+                raw.set_progress_handler(None, 0)
+        return execute(sql, params, many, context)
@@ -0,0 +1,450 @@
+"""
+Server-Sent Events о новых рецептах авторов, на которых подписан
+пользователь: одно открытое соединение вместо периодических опросов.
+
+Поток событий — отдельное ASGI-приложение (event_stream), его
+подключает backend.asgi; под WSGI эндпоинта нет. Публикует
+RecipeViewSet.perform_create после коммита транзакции.
+
+Брокер задаётся настройкой RECIPE_EVENTS['BROKER']. DatabaseBroker
+передаёт события между процессами через таблицу RecipeEvent: рецепт
+создаётся в воркере WSGI, а соединения держат процессы ASGI.
+LocalBroker работает внутри одного процесса — для разработки
+и тестов.
+
+Браузерный EventSource не умеет передавать заголовки, поэтому вместо
+токена API в адресе потока передаётся подписанный токен потока
+(POST /api/recipes/events/token/), действующий TOKEN_MAX_AGE секунд:
+постоянный токен не попадает в журналы доступа.
+
+Каждый подписчик получает события через очередь не длиннее
+QUEUE_SIZE. Если клиент не успевает читать, поток закрывается,
+а браузер переподключается с Last-Event-ID и дочитывает пропущенное
+из истории брокера (последние HISTORY событий).
+"""
+import asyncio
+from collections import defaultdict, deque, namedtuple
+from datetime import timedelta
+import json
+import logging
+import threading
+import time
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from recipes.models import RecipeEvent, Subscription
+
+from .aio import run_in_pool
+from .dbrouters import use_primary
+from .metrics import registry
+
+DEFAULTS = {
+    'BROKER': 'api.events.DatabaseBroker',
+    'PATH': '/api/recipes/events/',
+    'HEARTBEAT': 15,
+    'QUEUE_SIZE': 100,
+    'HISTORY': 1000,
+    'RETRY_MS': 3000,
+    'POLL_INTERVAL': 1.0,
+    'RETENTION': 24 * 60 * 60,
+    'PRUNE_INTERVAL': 300,
+    'TOKEN_MAX_AGE': 300,
+}
+
+TOKEN_SALT = 'api.events.stream'
+# Сколько секунд событие может быть не видно после своего id:
+# id выдаётся при вставке, а строка видна после коммита.
+SETTLE_SECONDS = 5
+
+logger = logging.getLogger('api.events')
+
+Message = namedtuple('Message', 'id event data')
+
+_broker = None
+
+
+def get_setting(name):
+    return getattr(settings, 'RECIPE_EVENTS', {}).get(name, DEFAULTS[name])
+
+
+def broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(get_setting('BROKER'))()
+    return _broker
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscriber:
+    """
+    Очередь событий одного соединения. Сообщения кладутся в неё
+    из любого потока через цикл событий соединения; None в очереди —
+    сигнал закрыть поток. backlog — пропущенные события из истории,
+    они отправляются до очереди и в её лимит не входят.
+    """
+
+    def __init__(self, channel, loop, size):
+        self.channel = channel
+        self.loop = loop
+        self.size = size
+        self.queue = asyncio.Queue()
+        self.backlog = []
+        self.overflowed = False
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Цикл событий уже закрыт, соединения нет.
+            pass
+
+    def _put(self, message):
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.size:
+            self.overflowed = True
+            registry.inc('recipe_events_total', {'result': 'overflow'})
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(message)
+
+
+class LocalBroker:
+    """
+    Брокер внутри процесса с историей последних событий.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history = deque(maxlen=get_setting('HISTORY'))
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channels, event, data):
+        with self._lock:
+            self._last_id += 1
+            message = Message(self._last_id, event, json.dumps(data))
+            self._dispatch(frozenset(channels), message)
+        return message.id
+
+    def _dispatch(self, channels, message):
+        """
+        Запомнить событие и раздать подписчикам; вызывается под
+        блокировкой, это сохраняет порядок событий.
+        """
+        self._history.append((channels, message))
+        for channel in channels:
+            for subscriber in self._subscribers.get(channel, ()):
+                subscriber.deliver(message)
+
+    def ready(self):
+        """
+        Подготовка перед подпиской, выполняется в пуле потоков.
+        """
+
+    def subscribe(self, channel, last_id=None):
+        """
+        Подписка из цикла событий соединения. С last_id подписчик
+        сначала получает события канала, вышедшие после него.
+        """
+        subscriber = Subscriber(
+            channel, asyncio.get_running_loop(), get_setting('QUEUE_SIZE')
+        )
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+            if last_id is not None:
+                subscriber.backlog = [
+                    message for channels, message in self._history
+                    if message.id > last_id and channel in channels
+                ]
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.channel]
+
+
+class DatabaseBroker(LocalBroker):
+    """
+    Брокер для нескольких процессов: publish пишет событие в таблицу
+    RecipeEvent из любого процесса, а в процессе с подписчиками поток
+    опроса раз в POLL_INTERVAL секунд забирает новые строки и раздаёт
+    их как LocalBroker. id события — id строки, поэтому Last-Event-ID
+    действует во всех процессах. При старте поток подгружает последние
+    HISTORY событий; строки старше RETENTION секунд поток удаляет
+    при старте и затем раз в PRUNE_INTERVAL секунд.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+        self._loaded = threading.Event()
+        self._stopped = threading.Event()
+        self._next_prune = 0
+        # (id, created_at) уже разданных событий за SETTLE_SECONDS.
+        self._recent = deque()
+
+    def publish(self, channels, event, data):
+        return RecipeEvent.objects.create(
+            channels=json.dumps(sorted(channels)),
+            event=event,
+            data=json.dumps(data),
+        ).id
+
+    def ready(self):
+        """
+        Запустить поток опроса и дождаться истории: без неё
+        переподключение с Last-Event-ID сразу после старта процесса
+        ничего бы не дочитало.
+        """
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(
+                    target=self._poll_forever, name='recipe-events',
+                    daemon=True
+                )
+                self._poller.start()
+        self._loaded.wait(timeout=get_setting('HEARTBEAT'))
+
+    def stop(self):
+        """
+        Остановить поток опроса (для тестов).
+        """
+        self._stopped.set()
+        if self._poller is not None:
+            self._poller.join()
+
+    def _poll_forever(self):
+        while not self._stopped.is_set():
+            try:
+                with use_primary():
+                    if not self._loaded.is_set():
+                        self._load_history()
+                        self._loaded.set()
+                    self._poll()
+                    if time.monotonic() >= self._next_prune:
+                        self._prune()
+            except DatabaseError:
+                logger.exception('Ошибка чтения событий о рецептах')
+            finally:
+                close_old_connections()
+            self._stopped.wait(get_setting('POLL_INTERVAL'))
+
+    def _load_history(self):
+        rows = list(RecipeEvent.objects.order_by('-id')[
+            :get_setting('HISTORY')
+        ])
+        with self._lock:
+            for row in reversed(rows):
+                self._history.append(self._message(row))
+                self._remember(row)
+            if rows:
+                self._last_id = rows[0].id
+
+    def _prune(self):
+        RecipeEvent.objects.filter(
+            created_at__lt=timezone.now() - timedelta(
+                seconds=get_setting('RETENTION')
+            )
+        ).delete()
+        self._next_prune = time.monotonic() + get_setting('PRUNE_INTERVAL')
+
+    def _poll(self):
+        """
+        Новые события: id больше последнего разданного, а также свежие
+        строки с меньшим id — их транзакция могла закоммититься позже.
+        """
+        settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+        rows = list(RecipeEvent.objects.filter(
+            Q(id__gt=self._last_id) | Q(created_at__gte=settled)
+        ).order_by('id'))
+        with self._lock:
+            while self._recent and self._recent[0][1] < settled:
+                self._recent.popleft()
+            seen = {pk for pk, _ in self._recent}
+            for row in rows:
+                if row.id in seen:
+                    continue
+                channels, message = self._message(row)
+                self._dispatch(channels, message)
+                self._remember(row)
+                self._last_id = max(self._last_id, row.id)
+
+    def _remember(self, row):
+        self._recent.append((row.id, row.created_at))
+
+    @staticmethod
+    def _message(row):
+        return (
+            frozenset(json.loads(row.channels)),
+            Message(row.id, row.event, row.data),
+        )
+
+
+def stream_token(user_id):
+    """
+    Подписанный токен потока событий для адреса EventSource.
+    """
+    return signing.dumps(user_id, salt=TOKEN_SALT)
+
+
+def publish_recipe(recipe, data):
+    """
+    Событие о новом рецепте всем подписчикам автора.
+    Вызывается после коммита транзакции, где создан рецепт.
+    """
+    followers = Subscription.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    channels = [user_channel(user_id) for user_id in followers]
+    if channels:
+        broker().publish(channels, 'recipe', data)
+
+
+def _authenticate(key, signed):
+    """
+    id пользователя по токену API или подписанному токену потока.
+    """
+    if not signed:
+        try:
+            user, _ = TokenAuthentication().authenticate_credentials(key)
+        except AuthenticationFailed:
+            return None
+        return user.pk
+    try:
+        user_id = signing.loads(
+            key, salt=TOKEN_SALT, max_age=get_setting('TOKEN_MAX_AGE')
+        )
+    except signing.BadSignature:
+        return None
+    active = get_user_model().objects.filter(pk=user_id, is_active=True)
+    return user_id if active.exists() else None
+
+
+def _credentials(scope):
+    """
+    Токен, признак токена потока и Last-Event-ID: токен API —
+    из заголовка Authorization, токен потока — из параметра token.
+    """
+    headers = dict(scope['headers'])
+    query = parse_qs(scope.get('query_string', b'').decode())
+    key, signed = None, False
+    auth = headers.get(b'authorization', b'').decode('latin1').split()
+    if len(auth) == 2 and auth[0].lower() == 'token':
+        key = auth[1]
+    elif query.get('token'):
+        key, signed = query['token'][0], True
+    last_id = headers.get(b'last-event-id', b'').decode('latin1') or (
+        query.get('lastEventId', [''])[0]
+    )
+    return key, signed, int(last_id) if last_id.isdigit() else None
+
+
+def _format(message):
+    return (
+        f'id: {message.id}\nevent: {message.event}\n'
+        f'data: {message.data}\n\n'
+    ).encode()
+
+
+async def _send_json(send, status, data):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body', 'body': json.dumps(data).encode()
+    })
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def event_stream(scope, receive, send):
+    """
+    GET PATH — поток событий text/event-stream для текущего
+    пользователя. Раз в HEARTBEAT секунд приходит комментарий,
+    чтобы прокси не закрывали простаивающее соединение.
+    """
+    if scope['method'] != 'GET':
+        return await _send_json(
+            send, 405, {'detail': f'Метод "{scope["method"]}" не разрешен.'}
+        )
+    key, signed, last_id = _credentials(scope)
+    user_id = await run_in_pool(_authenticate, key, signed) if key else None
+    if user_id is None:
+        return await _send_json(
+            send, 401, {'detail': 'Учетные данные не были предоставлены.'}
+        )
+
+    events = broker()
+    await run_in_pool(events.ready)
+    subscriber = events.subscribe(user_channel(user_id), last_id)
+    disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+    get = asyncio.ensure_future(subscriber.queue.get())
+    heartbeat = get_setting('HEARTBEAT')
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # nginx не должен буферизовать поток.
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': f'retry: {get_setting("RETRY_MS")}\n\n'.encode(),
+            'more_body': True,
+        })
+        for message in subscriber.backlog:
+            await send({
+                'type': 'http.response.body',
+                'body': _format(message),
+                'more_body': True,
+            })
+        while True:
+            done, _ = await asyncio.wait(
+                {get, disconnect}, timeout=heartbeat,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                return
+            if get in done:
+                message = get.result()
+                if message is None:
+                    break
+                body = _format(message)
+                registry.inc('recipe_events_total', {'result': 'sent'})
+                get = asyncio.ensure_future(subscriber.queue.get())
+            else:
+                body = b': ping\n\n'
+            await send({
+                'type': 'http.response.body', 'body': body, 'more_body': True
+            })
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        events.unsubscribe(subscriber)
+        get.cancel()
+        disconnect.cancel()
@@ -0,0 +1,100 @@
+"""
+Планы выполнения SQL: EXPLAIN для PostgreSQL и SQLite, поиск
+полных просмотров таблиц и сортировок без индекса.
+
+Используется командой index_advisor и журналом медленных запросов
+SlowQueryMiddleware.
+"""
+import logging
+import re
+import time
+
+from django.conf import settings
+
+from .metrics import registry, view_label
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 200,
+    'EXPLAIN': True,
+}
+
+logger = logging.getLogger('api.slow_queries')
+
+_SELECT = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+PROBLEMS = {
+    'postgresql': (
+        ('seq_scan', re.compile(r'Seq Scan on (\w+)')),
+        ('sort', re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b()')),
+    ),
+    'sqlite': (
+        ('seq_scan', re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.* USING )')),
+        ('sort', re.compile(r'USE TEMP B-TREE FOR (?:ORDER|GROUP) BY()')),
+    ),
+}
+
+
+def is_select(sql):
+    return bool(_SELECT.match(sql))
+
+
+def get_setting(name):
+    return getattr(settings, 'SLOW_QUERIES', {}).get(name, DEFAULTS[name])
+
+
+def explain_sql(connection, sql, params):
+    """
+    Строки плана запроса. Выполняется курсором БД напрямую, мимо
+    execute_wrapper: сам EXPLAIN не попадает в счётчики запросов.
+    """
+    if connection.vendor == 'sqlite':
+        sql = f'EXPLAIN QUERY PLAN {sql}'
+    elif connection.vendor == 'postgresql':
+        sql = f'EXPLAIN {sql}'
+    else:
+        return []
+    with connection.cursor() as cursor:
+        cursor.cursor.execute(sql, params)
+        return [str(row[-1]) for row in cursor.cursor.fetchall()]
+
+
+def plan_problems(vendor, plan):
+    """
+    [(вид, таблица)] для полных просмотров ('seq_scan') и сортировок
+    без индекса ('sort', таблица пустая).
+    """
+    problems = []
+    for line in plan:
+        for kind, pattern in PROBLEMS.get(vendor, ()):
+            match = pattern.search(line)
+            if match:
+                problems.append((kind, match.group(1)))
+    return problems
+
+
+class SlowQueryLog:
+    """
+    execute_wrapper: запросы дольше порога пишутся в журнал
+    api.slow_queries вместе с планом выполнения.
+    """
+
+    def __init__(self, request, threshold_ms, explain=True):
+        self.request = request
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+        if duration >= self.threshold:
+            label = view_label(self.request)
+            registry.inc('db_slow_queries_total', {'view': label})
+            plan = []
+            if self.explain and not many and is_select(sql):
+                plan = explain_sql(context['connection'], sql, params)
+            logger.warning(
+                'Медленный запрос в %s: %.1f мс: %s\n%s',
+                label, duration * 1000, sql, '\n'.join(plan)
+            )
+        return result
@@ -1,43 +1,104 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
+from django_filters.widgets import BaseCSVWidget
 
-from recipes.models import Recipe
+from .indexes import ingredient_index
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+class MultiValueCSVWidget(BaseCSVWidget, forms.TextInput):
+    """
+    Значения через запятую и повтором параметра: ?author=1,2&author=5
+    """
+
+    def value_from_datadict(self, data, files, name):
+        if not hasattr(data, 'getlist') or name not in data:
+            return super().value_from_datadict(data, files, name)
+        return [
+            item for value in data.getlist(name)
+            for item in value.split(',') if item
+        ]
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """
+    Список чисел через запятую или повтором параметра:
+    ?ingredients=1,5,9, ?author=1&author=2
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultiValueCSVWidget)
+        super().__init__(*args, **kwargs)
 
 
 class RecipeFilter(filters.FilterSet):
     """
     Фильтрация рецептов по:
-    - Id автора
+    - Id автора (одному или нескольким)
     - Наличию в избранном
     - Наличию в корзине
+    - Наличию всех указанных ингредиентов
+    - Отсутствию указанных ингредиентов
     """
-    author = filters.NumberFilter(field_name='author__id')
+    author = NumberInFilter(field_name='author_id')
     is_favorited = filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.NumberFilter(method='filter_in_shopping_cart')
+    ingredients = NumberInFilter(method='filter_ingredients')
+    exclude_ingredients = NumberInFilter(method='filter_exclude_ingredients')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'is_favorited', 'is_in_shopping_cart',
+            'ingredients', 'exclude_ingredients',
+        ]
 
-    def filter_is_favorited(self, recipes, name, value):
-        user = self.request.user
+    def filter_ingredients(self, recipes, name, value):
+        ids = ingredient_index.recipes_with_all(int(pk) for pk in value)
+        # Исключения считаем здесь же, разностью множеств в памяти,
+        # чтобы в запрос ушёл один список id.
+        excluded = self.form.cleaned_data.get('exclude_ingredients')
+        if excluded:
+            ids -= ingredient_index.recipes_with_any(
+                int(pk) for pk in excluded
+            )
+        return recipes.filter(pk__in=sorted(ids))
 
-        if not user.is_authenticated:
-            return recipes.none() if value == 1 else recipes
-
-        if value == 1:
-            return recipes.filter(favorites__user=user)
-        if value == 0:
-            return recipes.exclude(favorites__user=user)
-        return recipes
+    def filter_exclude_ingredients(self, recipes, name, value):
+        if self.form.cleaned_data.get('ingredients'):
+            # Уже учтено в filter_ingredients.
+            return recipes
+        ids = ingredient_index.recipes_with_any(int(pk) for pk in value)
+        if not ids:
+            return recipes
+        return recipes.exclude(pk__in=sorted(ids))
 
-    def filter_in_shopping_cart(self, recipes, name, value):
+    def _filter_user_list(self, recipes, model, value):
+        """
+        Рецепты из списка пользователя (value=1) или вне его (value=0).
+        Входящие — IN (SELECT recipe_id ...), полусоединение от строк
+        пользователя: без JOIN, который при двух списках сразу множит
+        строки. Остальные — коррелированный NOT EXISTS по индексу
+        (user, recipe) вместо NOT IN (подзапрос) от exclude(),
+        который PostgreSQL не превращает в антисоединение.
+        """
         user = self.request.user
 
         if not user.is_authenticated:
             return recipes.none() if value == 1 else recipes
 
+        in_list = model.objects.filter(user=user)
         if value == 1:
-            return recipes.filter(shoppingcarts__user=user)
+            return recipes.filter(pk__in=in_list.values('recipe_id'))
         if value == 0:
-            return recipes.exclude(shoppingcarts__user=user)
+            return recipes.filter(
+                ~Exists(in_list.filter(recipe=OuterRef('pk')))
+            )
         return recipes
+
+    def filter_is_favorited(self, recipes, name, value):
+        return self._filter_user_list(recipes, Favorite, value)
+
+    def filter_in_shopping_cart(self, recipes, name, value):
+        return self._filter_user_list(recipes, ShoppingCart, value)
@@ -0,0 +1,210 @@
+"""
+Инвертированный индекс «ингредиент → рецепты».
+
+Для каждого ингредиента хранится отсортированный массив id рецептов
+(posting list), для каждого рецепта — кортеж id его ингредиентов.
+Пересечения и разности считаются в памяти процесса, в БД уходит
+только итоговый список id.
+
+Индекс живёт в каждом процессе отдельно. Процессы синхронизируются
+через счётчик версии в общем кэше: тот, кто изменил ингредиенты
+рецепта, обновляет свою копию и увеличивает версию, остальные при
+расхождении версий перестраивают индекс целиком.
+"""
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .dbrouters import use_primary
+from recipes.models import RecipeIngredient
+
+VERSION_KEY = 'ingredient-index:version'
+
+EMPTY = array('q')
+
+
+class IngredientIndex:
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._recipes = {}
+        self._version = None
+        self._built_at = 0.0
+
+    @staticmethod
+    def _current_version():
+        cache.add(VERSION_KEY, 0, timeout=None)
+        return cache.get(VERSION_KEY, 0)
+
+    def _is_stale(self):
+        if self._version is None:
+            return True
+        if self.ttl and time.monotonic() - self._built_at > self.ttl:
+            return True
+        return self._current_version() != self._version
+
+    def _ensure_fresh(self):
+        if self._is_stale():
+            self.rebuild()
+
+    def rebuild(self):
+        """
+        Полная перестройка индекса одним проходом по RecipeIngredient.
+        """
+        # Версию читаем до выборки: изменения, сделанные во время
+        # перестройки, приведут к повторной перестройке, а не потеряются.
+        version = self._current_version()
+        postings = defaultdict(list)
+        recipes = defaultdict(list)
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+        # Версия уже новая: индекс по отстающей реплике остался бы
+        # без последних изменений до следующей перестройки.
+        with use_primary():
+            for ingredient_id, recipe_id in rows.iterator(chunk_size=10000):
+                postings[ingredient_id].append(recipe_id)
+                recipes[recipe_id].append(ingredient_id)
+
+        with self._lock:
+            self._postings = {
+                ingredient_id: array('q', recipe_ids)
+                for ingredient_id, recipe_ids in postings.items()
+            }
+            self._recipes = {
+                recipe_id: tuple(ingredient_ids)
+                for recipe_id, ingredient_ids in recipes.items()
+            }
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def _bump_version(self):
+        cache.add(VERSION_KEY, 0, timeout=None)
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            # Ключ вытеснен из кэша между add и incr.
+            self._version = None
+            return
+        # Если кто-то успел изменить индекс до нас, наша копия
+        # не содержит его изменений — перестроимся при следующем запросе.
+        if self._version is not None and version != self._version + 1:
+            self._version = None
+        else:
+            self._version = version
+
+    def _discard(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            posting = self._postings.get(ingredient_id)
+            if posting is None:
+                continue
+            pos = bisect_left(posting, recipe_id)
+            if pos < len(posting) and posting[pos] == recipe_id:
+                del posting[pos]
+            if not posting:
+                del self._postings[ingredient_id]
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """
+        Заменить набор ингредиентов рецепта в индексе.
+        """
+        with self._lock:
+            if self._version is not None:
+                self._discard(recipe_id)
+                ingredient_ids = tuple(sorted(set(ingredient_ids)))
+                for ingredient_id in ingredient_ids:
+                    insort(
+                        self._postings.setdefault(ingredient_id, array('q')),
+                        recipe_id
+                    )
+                if ingredient_ids:
+                    self._recipes[recipe_id] = ingredient_ids
+            self._bump_version()
+
+    def remove_recipe(self, recipe_id):
+        """
+        Убрать удалённый рецепт из индекса.
+        """
+        with self._lock:
+            if self._version is not None:
+                self._discard(recipe_id)
+            self._bump_version()
+
+    def recipes_with_all(self, ingredient_ids):
+        """
+        Id рецептов, содержащих все перечисленные ингредиенты.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            postings = sorted(
+                (self._postings.get(ingredient_id, EMPTY)
+                 for ingredient_id in set(ingredient_ids)),
+                key=len
+            )
+        if not postings:
+            return set()
+        # Начинаем с самого короткого списка, чтобы множество
+        # кандидатов было минимальным с первого шага.
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result.intersection_update(posting)
+        return result
+
+    def recipes_with_any(self, ingredient_ids):
+        """
+        Id рецептов, содержащих хотя бы один из ингредиентов.
+        """
+        self._ensure_fresh()
+        result = set()
+        with self._lock:
+            for ingredient_id in set(ingredient_ids):
+                result.update(self._postings.get(ingredient_id, EMPTY))
+        return result
+
+    def ingredients_of(self, recipe_id):
+        """
+        Id ингредиентов рецепта.
+        """
+        self._ensure_fresh()
+        return self._recipes.get(recipe_id, ())
+
+    def rank_by_coverage(self, ingredient_ids, min_coverage=0.0):
+        """
+        Рецепты, упорядоченные по доле ингредиентов, которые есть
+        в наборе ingredient_ids.
+
+        Возвращает список (recipe_id, coverage), лучшие — первыми.
+        Фактически это умножение разреженной матрицы
+        «рецепт × ингредиент» на вектор набора: просматриваются только
+        posting-списки из набора, а не все рецепты.
+        """
+        self._ensure_fresh()
+        hits = Counter()
+        with self._lock:
+            for ingredient_id in set(ingredient_ids):
+                hits.update(self._postings.get(ingredient_id, EMPTY))
+            recipes = self._recipes
+            ranked = [
+                (recipe_id, matched / len(recipes[recipe_id]),
+                 len(recipes[recipe_id]) - matched)
+                for recipe_id, matched in hits.items()
+                if recipe_id in recipes
+            ]
+        ranked = [item for item in ranked if item[1] >= min_coverage]
+        # Полнее покрытые, затем с меньшим числом недостающих, затем новые.
+        ranked.sort(key=lambda item: (-item[1], item[2], -item[0]))
+        return [(recipe_id, coverage) for recipe_id, coverage, _ in ranked]
+
+
+ingredient_index = IngredientIndex(
+    ttl=getattr(settings, 'INGREDIENT_INDEX_TTL', None)
+)
@@ -0,0 +1,269 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import json
+from pathlib import Path
+import random
+import re
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from api.replay import (
+    DEFAULT_SOURCES,
+    endpoint_name,
+    first_letters,
+    load_sources,
+    substitute,
+    variables,
+)
+from recipes.fakedata import seed
+
+QUERY_COUNT = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон: засевает синтетические данные и повторяет '
+        'смесь запросов из Postman-коллекции и JSONL-файлов внутри '
+        'процесса или против запущенного сервера. Печатает p50/p95/p99, '
+        'RPS и число SQL-запросов по эндпоинтам, сравнивает с базовой '
+        'линией.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='*', default=DEFAULT_SOURCES,
+            help='Postman-коллекции (.json) и смеси запросов (.jsonl).'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например '
+                 'http://127.0.0.1:8000. По умолчанию — внутри процесса '
+                 'на тестовой БД.'
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--scale', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не пересоздавать тестовую БД (режим внутри процесса).'
+        )
+        parser.add_argument('--baseline', help='JSON для сравнения.')
+        parser.add_argument(
+            '--save-baseline', help='Сохранить результат как базовую линию.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p95 и числа SQL-запросов относительно '
+                 'базовой линии.'
+        )
+
+    def handle(self, *args, **options):
+        mix = load_sources(options['sources'])
+        if not mix:
+            raise CommandError('Смесь запросов пуста.')
+
+        if options['url']:
+            # Сервер работает с той же БД, что и настройки: данные
+            # добавляются к существующим под префиксом bench_.
+            data = seed(options['scale'], options['seed'])
+            results, elapsed = self._run(mix, data, options)
+        else:
+            setup_test_environment()
+            old_config = setup_databases(
+                verbosity=0, interactive=False, keepdb=options['keepdb']
+            )
+            try:
+                data = seed(options['scale'], options['seed'])
+                # Замер без лимитов частоты (api.throttling).
+                with override_settings(REST_FRAMEWORK={
+                    **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}
+                }):
+                    results, elapsed = self._run(mix, data, options)
+            finally:
+                teardown_databases(
+                    old_config, verbosity=0, keepdb=options['keepdb']
+                )
+                teardown_test_environment()
+
+        report = self._report(results, elapsed, options)
+        if options['save_baseline']:
+            Path(options['save_baseline']).write_text(
+                json.dumps(report, indent=2, ensure_ascii=False)
+            )
+        if options['baseline']:
+            self._compare(report, options)
+
+    def _plan(self, mix, data, count, rng):
+        values = variables(data, rng)
+        # Запросы с неизвестными переменными (токены из тестов коллекции
+        # и т. п.) повторить нельзя — пропускаем.
+        mix = [
+            item for item in mix
+            if substitute(item['url'], values) is not None
+        ]
+        weights = [item['weight'] for item in mix]
+        plan = []
+        for item in rng.choices(mix, weights=weights, k=count):
+            url = substitute(item['url'], values)
+            token = rng.choice(data['tokens']) if item['auth'] else None
+            plan.append((
+                endpoint_name(item['method'], item['url'], item['auth']),
+                item['method'], url, token,
+            ))
+        return plan
+
+    def _sender(self, base_url):
+        if base_url:
+            def send(method, url, token):
+                headers = {'Authorization': f'Token {token}'} if token else {}
+                request = Request(base_url + url, method=method,
+                                  headers=headers)
+                try:
+                    with urlopen(request) as response:
+                        response.read()
+                        status = response.status
+                        timing = response.headers.get('Server-Timing', '')
+                except HTTPError as error:
+                    status = error.code
+                    timing = error.headers.get('Server-Timing', '')
+                match = QUERY_COUNT.search(timing)
+                return status, int(match.group(1)) if match else None
+            return send
+
+        local = threading.local()
+
+        def send(method, url, token):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            queries = 0
+
+            def count(execute, *args):
+                nonlocal queries
+                queries += 1
+                return execute(*args)
+
+            extra = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+            with connection.execute_wrapper(count):
+                response = local.client.generic(method, url, **extra)
+            return response.status_code, queries
+        return send
+
+    def _run(self, mix, data, options):
+        rng = random.Random(options['seed'])
+        data['letters'] = first_letters(data['ingredients'])
+        send = self._sender(options['url'])
+        for _, method, url, token in self._plan(
+            mix, data, options['warmup'], rng
+        ):
+            send(method, url, token)
+
+        plan = self._plan(mix, data, options['requests'], rng)
+        results = []
+        lock = threading.Lock()
+
+        def run(task):
+            endpoint, method, url, token = task
+            start = time.perf_counter()
+            status, queries = send(method, url, token)
+            duration = time.perf_counter() - start
+            with lock:
+                results.append((endpoint, duration, status, queries))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(run, plan))
+        return results, time.perf_counter() - start
+
+    def _report(self, results, elapsed, options):
+        grouped = defaultdict(list)
+        for endpoint, duration, status, queries in results:
+            grouped[endpoint].append((duration, status, queries))
+
+        endpoints = {}
+        for endpoint, rows in sorted(grouped.items()):
+            durations = [duration for duration, _, _ in rows]
+            queries = [count for _, _, count in rows if count is not None]
+            endpoints[endpoint] = {
+                'requests': len(rows),
+                'p50_ms': round(percentile(durations, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(durations, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(durations, 0.99) * 1000, 2),
+                'rps': round(len(rows) / elapsed, 2),
+                'queries': (
+                    round(sum(queries) / len(queries), 2) if queries
+                    else None
+                ),
+                'errors': sum(1 for _, status, _ in rows if status >= 500),
+            }
+
+        self.stdout.write(
+            f'{"эндпоинт":<58} {"n":>5} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"rps":>8} {"sql":>6} {"5xx":>4}'
+        )
+        for endpoint, row in endpoints.items():
+            self.stdout.write(
+                f'{endpoint:<58} {row["requests"]:>5} {row["p50_ms"]:>8} '
+                f'{row["p95_ms"]:>8} {row["p99_ms"]:>8} {row["rps"]:>8} '
+                f'{row["queries"] if row["queries"] is not None else "-":>6} '
+                f'{row["errors"]:>4}'
+            )
+        total_rps = round(len(results) / elapsed, 2)
+        self.stdout.write(
+            f'Всего: {len(results)} запросов за {elapsed:.2f} с, '
+            f'{total_rps} RPS, параллельность {options["concurrency"]}.'
+        )
+        return {
+            'meta': {
+                'mode': options['url'] or 'in-process',
+                'requests': len(results),
+                'concurrency': options['concurrency'],
+                'scale': options['scale'],
+                'rps': total_rps,
+            },
+            'endpoints': endpoints,
+        }
+
+    def _compare(self, report, options):
+        baseline = json.loads(Path(options['baseline']).read_text())
+        regressions = []
+        for endpoint, row in report['endpoints'].items():
+            base = baseline['endpoints'].get(endpoint)
+            if base is None:
+                continue
+            if row['p95_ms'] > base['p95_ms'] * (1 + options['tolerance']):
+                regressions.append(
+                    f'{endpoint}: p95 {base["p95_ms"]} -> {row["p95_ms"]} мс'
+                )
+            if (row['queries'] is not None and base['queries'] is not None
+                    and row['queries']
+                    > base['queries'] * (1 + options['tolerance'])):
+                regressions.append(
+                    f'{endpoint}: SQL {base["queries"]} -> {row["queries"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базовой линии:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено.'))
@@ -0,0 +1,242 @@
+import random
+import re
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api.explain import explain_sql, is_select, plan_problems
+from api.queryinspector import fingerprint
+from api.replay import (
+    DEFAULT_SOURCES,
+    endpoint_name,
+    first_letters,
+    load_sources,
+    substitute,
+    variables,
+)
+from recipes.models import Favorite, Ingredient, Recipe, UserWithAvatar
+
+PROJECT_APPS = ('recipes',)
+
+
+def existing_indexes(model):
+    """
+    Наборы колонок, по которым у таблицы уже есть индексы.
+    """
+    meta = model._meta
+    columns = {field.name: field.column for field in meta.concrete_fields}
+    indexes = [
+        (field.column,) for field in meta.concrete_fields
+        if field.primary_key or field.unique or field.db_index
+    ]
+    indexes += [
+        tuple(columns[name.lstrip('-')] for name in index.fields)
+        for index in meta.indexes if index.fields
+    ]
+    indexes += [
+        tuple(columns[name] for name in constraint.fields)
+        for constraint in meta.constraints
+        if getattr(constraint, 'fields', None)
+    ]
+    indexes += [
+        tuple(columns[name] for name in fields)
+        for fields in meta.unique_together
+    ]
+    return indexes
+
+
+def suggest(sql, tables, models):
+    """
+    Предложения для таблиц с полным просмотром или сортировкой:
+    [('index', модель, поля)] — составной индекс «условия равенства,
+    затем сортировка», [('pattern', модель, колонка)] — индекс для
+    поиска по префиксу.
+    """
+    head, _, order = sql.partition(' ORDER BY ')
+    where = head.partition(' WHERE ')[2]
+    suggestions = []
+    for table in tables:
+        model = models.get(table)
+        if model is None or model._meta.app_label not in PROJECT_APPS:
+            continue
+        column = rf'"{table}"\."(\w+)"'
+        prefix = re.search(
+            rf'UPPER\({column}::text\) LIKE|{column} LIKE', where
+        )
+        if prefix:
+            suggestions.append(
+                ('pattern', model, prefix.group(1) or prefix.group(2))
+            )
+            continue
+        names = {field.column: field.name
+                 for field in model._meta.concrete_fields}
+        fields = list(dict.fromkeys(
+            names[name] for name in re.findall(
+                rf'{column} (?:= |IN \()', where
+            )
+        ))
+        fields += [
+            ('-' if direction == 'DESC' else '') + names[name]
+            for name, direction in re.findall(
+                rf'{column} (ASC|DESC)', order
+            )
+            if names[name] not in fields
+        ]
+        if not fields:
+            continue
+        wanted = tuple(
+            model._meta.get_field(name.lstrip('-')).column
+            for name in fields
+        )
+        if any(index[:len(wanted)] == wanted
+               for index in existing_indexes(model)):
+            continue
+        suggestions.append(('index', model, tuple(fields)))
+    return suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Советник по индексам: выполняет запросы горячих эндпоинтов '
+        'на текущей БД, пропускает каждый SQL-запрос через EXPLAIN, '
+        'находит полные просмотры таблиц и сортировки без индекса '
+        'и предлагает индексы. Планы зависят от объёма данных: '
+        'запускайте после generate_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='*', default=DEFAULT_SOURCES,
+            help='Postman-коллекции (.json) и смеси запросов (.jsonl).'
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help='Id пользователя для запросов с авторизацией. '
+                 'По умолчанию — пользователь с избранным.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Печатать планы всех запросов, а не только проблемных.'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        data = {
+            'users': list(UserWithAvatar.objects.values_list(
+                'id', flat=True)[:1000]),
+            'recipes': list(Recipe.objects.values_list(
+                'id', flat=True)[:1000]),
+            'ingredients': list(Ingredient.objects.values_list(
+                'id', flat=True)[:1000]),
+        }
+        if not data['recipes']:
+            raise CommandError(
+                'В БД нет рецептов: сначала загрузите данные '
+                '(generate_data).'
+            )
+        data['letters'] = first_letters(data['ingredients'])
+        user_id = options['user'] or Favorite.objects.values_list(
+            'user_id', flat=True
+        ).first() or data['users'][0]
+
+        setup_test_environment()
+        try:
+            queries = self._capture(
+                load_sources(options['sources']),
+                variables(data, rng),
+                UserWithAvatar.objects.get(pk=user_id),
+            )
+        finally:
+            teardown_test_environment()
+
+        models = {model._meta.db_table: model for model in apps.get_models()}
+        suggestions = {}
+        for sql, params, endpoints in queries.values():
+            plan = explain_sql(connection, sql, params)
+            problems = plan_problems(connection.vendor, plan)
+            if not problems and not options['plans']:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                ', '.join(sorted(endpoints))
+            ))
+            self.stdout.write(sql)
+            for line in plan:
+                self.stdout.write(f'    {line}')
+            tables = {table for kind, table in problems if table}
+            if any(kind == 'sort' for kind, _ in problems):
+                tables.update(re.findall(
+                    r'"(\w+)"\."\w+" (?:ASC|DESC)',
+                    sql.partition(' ORDER BY ')[2]
+                ))
+            for suggestion in suggest(sql, tables, models):
+                suggestions.setdefault(suggestion, set()).update(endpoints)
+        self._report(suggestions)
+
+    def _capture(self, mix, values, user):
+        """
+        {отпечаток: (sql, params, {эндпоинты})} — SELECT-запросы,
+        выполненные при одном вызове каждого эндпоинта смеси.
+        """
+        anonymous = APIClient()
+        authorized = APIClient()
+        authorized.force_authenticate(user)
+        queries = {}
+        seen = set()
+        for item in mix:
+            name = endpoint_name(item['method'], item['url'], item['auth'])
+            url = substitute(item['url'], values)
+            if name in seen or url is None:
+                continue
+            seen.add(name)
+            captured = []
+
+            def capture(execute, sql, params, many, context):
+                if not many and is_select(sql):
+                    captured.append((sql, params))
+                return execute(sql, params, many, context)
+
+            client = authorized if item['auth'] else anonymous
+            with connection.execute_wrapper(capture):
+                client.generic(item['method'], url)
+            for sql, params in captured:
+                queries.setdefault(
+                    fingerprint(sql), (sql, params, set())
+                )[2].add(name)
+        return queries
+
+    def _report(self, suggestions):
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS(
+                'Полных просмотров и сортировок без индекса не найдено.'
+            ))
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING('Предлагаемые индексы'))
+        for (kind, model, target), endpoints in suggestions.items():
+            table = model._meta.db_table
+            self.stdout.write(f'# {", ".join(sorted(endpoints))}')
+            if kind == 'index':
+                name = '_'.join(
+                    [model._meta.model_name, *(
+                        field.lstrip('-') for field in target
+                    ), 'idx']
+                )[:30]
+                self.stdout.write(
+                    f'{model.__name__}.Meta.indexes: models.Index('
+                    f'fields={list(target)!r}, name={name!r})'
+                )
+            else:
+                # Поиск istartswith на PostgreSQL сравнивает
+                # UPPER(col::text) LIKE 'X%': нужен индекс по выражению
+                # с text_pattern_ops, в Meta.indexes его не описать.
+                self.stdout.write(
+                    f'PostgreSQL, RunSQL: CREATE INDEX {table}_{target}_'
+                    f'upper_like_idx ON {table} '
+                    f'(UPPER({target}::text) text_pattern_ops);'
+                )
+        self.stdout.write(
+            'Добавьте индексы в модели и выполните makemigrations.'
+        )
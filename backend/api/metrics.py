@@ -0,0 +1,304 @@
+"""
+Метрики производительности в формате Prometheus.
+
+Гистограммы и счётчики копятся в памяти процесса. Если задан общий
+каталог METRICS['MULTIPROCESS_DIR'], каждый процесс периодически
+сбрасывает туда своё состояние файлом metrics-<pid>.json, а эндпоинт
+/metrics суммирует все файлы — так метрики собираются со всех
+воркеров gunicorn. Файлы завершившихся процессов при сборе
+переносятся в metrics-archive.json: счётчики не убывают, а число
+файлов не растёт с каждым перезапуском воркера.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+import fcntl
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'MULTIPROCESS_DIR': None,
+    'FLUSH_INTERVAL': 5,
+}
+
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Полное время обработки запроса.', SECONDS_BUCKETS),
+    'db_query_duration_seconds': (
+        'Суммарное время SQL-запросов за запрос.', SECONDS_BUCKETS),
+    'serializer_duration_seconds': (
+        'Время сериализации ответа.', SECONDS_BUCKETS),
+    'db_queries_per_request': (
+        'Число SQL-запросов за запрос.', COUNT_BUCKETS),
+}
+
+COUNTERS = {
+    'http_requests_total': 'Число обработанных запросов.',
+    'db_slow_queries_total': 'Число SQL-запросов дольше порога.',
+    'recipe_events_total': 'События о новых рецептах: отправлено '
+                           'и потоков закрыто из-за переполнения.',
+    'throttled_requests_total': 'Запросы, отклонённые лимитом частоты.',
+    'request_deadline_exceeded_total': 'Запросы, прерванные по сроку '
+                                       'обработки (ответ 503).',
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+class RequestTimings:
+    """
+    Замеры одного запроса. Текущий объект лежит в current_timings.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._flushed_at = 0.0
+
+    @staticmethod
+    def _key(labels):
+        return json.dumps(labels, sort_keys=True)
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {}).setdefault(
+                key, {'buckets': [0] * (len(buckets) + 1),
+                      'sum': 0.0, 'count': 0}
+            )
+            series['buckets'][bisect_left(buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+        self._maybe_flush()
+
+    def inc(self, name, labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[key] = counters.get(key, 0) + amount
+        self._maybe_flush()
+
+    def _snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps({
+                'histograms': self._histograms,
+                'counters': self._counters,
+            }))
+
+    def _maybe_flush(self, force=False):
+        directory = get_setting('MULTIPROCESS_DIR')
+        now = time.monotonic()
+        if not directory or (
+            not force
+            and now - self._flushed_at < get_setting('FLUSH_INTERVAL')
+        ):
+            return
+        self._flushed_at = now
+        path = Path(directory) / f'metrics-{os.getpid()}.json'
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self._snapshot()))
+        # Переименование атомарно: читатель не увидит файл наполовину.
+        tmp.replace(path)
+
+    def _collect(self):
+        directory = get_setting('MULTIPROCESS_DIR')
+        if not directory:
+            return [self._snapshot()]
+        self._maybe_flush(force=True)
+        directory = Path(directory)
+        # Под блокировкой сборщик не увидит файл процесса одновременно
+        # с архивом, в который его уже перенёс другой сборщик.
+        with open(directory / 'metrics.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            _archive_dead(directory)
+            return _read_states(directory.glob('metrics-*.json'))
+
+    def render(self):
+        """
+        Сумма по всем процессам в текстовом формате Prometheus.
+        """
+        merged = _merge(self._collect())
+        histograms, counters = merged['histograms'], merged['counters']
+
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, value in sorted(histograms.get(name, {}).items()):
+                labels = json.loads(key)
+                cumulative = 0
+                for bound, count in zip(
+                    (*buckets, '+Inf'), value['buckets']
+                ):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{_labels(labels, le=bound)} '
+                        f'{cumulative}'
+                    )
+                lines.append(f'{name}_sum{_labels(labels)} {value["sum"]}')
+                lines.append(
+                    f'{name}_count{_labels(labels)} {value["count"]}'
+                )
+        for name, help_text in COUNTERS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for key, value in sorted(counters.get(name, {}).items()):
+                lines.append(f'{name}{_labels(json.loads(key))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _merge(states):
+    histograms, counters = {}, {}
+    for state in states:
+        for name, series in state['histograms'].items():
+            merged = histograms.setdefault(name, {})
+            for key, value in series.items():
+                total = merged.setdefault(key, {
+                    'buckets': [0] * len(value['buckets']),
+                    'sum': 0.0, 'count': 0,
+                })
+                for pos, count in enumerate(value['buckets']):
+                    total['buckets'][pos] += count
+                total['sum'] += value['sum']
+                total['count'] += value['count']
+        for name, series in state['counters'].items():
+            merged = counters.setdefault(name, {})
+            for key, value in series.items():
+                merged[key] = merged.get(key, 0) + value
+    return {'histograms': histograms, 'counters': counters}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_states(paths):
+    states = []
+    for path in paths:
+        try:
+            states.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return states
+
+
+def _archive_dead(directory):
+    """
+    Перенести файлы завершившихся процессов в metrics-archive.json.
+    Вызывается под блокировкой каталога.
+    """
+    dead = [
+        path for path in directory.glob('metrics-*.json')
+        if path.stem[len('metrics-'):].isdigit()
+        and not _pid_alive(int(path.stem[len('metrics-'):]))
+    ]
+    if not dead:
+        return
+    archive = directory / 'metrics-archive.json'
+    tmp = archive.with_suffix('.tmp')
+    tmp.write_text(json.dumps(_merge(_read_states([archive, *dead]))))
+    tmp.replace(archive)
+    for path in dead:
+        path.unlink(missing_ok=True)
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **{key: str(value) for key, value in extra.items()}}
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for key, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+registry = Registry()
+
+
+def view_label(request):
+    """
+    Имя обработчика для меток: RecipeViewSet.list,
+    RecipeViewSet.download_shopping_cart и т. п.
+    """
+    return getattr(request, 'view_label', None) or 'unresolved'
+
+
+def resolve_view_label(view_func, method):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'view')
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+def instrument_serializers():
+    """
+    Засекать время BaseSerializer.data. Вложенные вызовы .data
+    (например, в get_recipes) учитываются один раз — во внешнем.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, 'instrumented', False):
+        return
+
+    def data(self):
+        timings = current_timings.get()
+        if timings is None or timings.serializer_depth:
+            return original.fget(self)
+        timings.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            timings.serializer_depth -= 1
+            timings.serializer += time.perf_counter() - start
+
+    BaseSerializer.data = property(data)
+    BaseSerializer.data.fget.instrumented = True
@@ -0,0 +1,367 @@
+import asyncio
+from contextlib import contextmanager
+import cProfile
+import logging
+import time
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+from rest_framework.authentication import get_authorization_header
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.authtoken.models import Token
+
+from .aio import execute_wrapper
+from .dbrouters import (
+    get_setting as get_replica_setting,
+    pin_key,
+    read_from_primary,
+    replicas,
+)
+from .deadlines import (
+    RequestDeadline,
+    get_setting as get_deadline_setting,
+    view_deadline,
+)
+from .explain import SlowQueryLog, get_setting as get_slow_query_setting
+from .metrics import (
+    RequestTimings,
+    current_timings,
+    get_setting,
+    instrument_serializers,
+    registry,
+    resolve_view_label,
+    view_label,
+)
+from .queryinspector import (
+    QueryBudgetExceeded,
+    QueryInspector,
+    get_setting as get_inspector_setting,
+    query_budget,
+)
+from .profiling import get_setting as get_profiler_setting, save_profile
+from .renderers import get_setting as get_compression_setting
+
+logger = logging.getLogger('api.queries')
+
+
+class HybridMiddleware:
+    """
+    Middleware для WSGI и ASGI. Подкласс описывает обработку
+    контекстным менеджером around(request), который отдаёт состояние,
+    и finish(request, response, state) для ответа; вызов get_response
+    между ними синхронный или асинхронный в зависимости от сервера.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with self.around(request) as state:
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        with self.around(request) as state:
+            response = await self.get_response(request)
+        return self.finish(request, response, state)
+
+    @contextmanager
+    def around(self, request):
+        yield None
+
+    def finish(self, request, response, state):
+        return response
+
+
+class PerformanceMiddleware(HybridMiddleware):
+    """
+    Замеры каждого запроса: число и время SQL-запросов, время
+    сериализации и полное время. Отдаются заголовком Server-Timing
+    и копятся в гистограммах для /metrics.
+    """
+
+    def __init__(self, get_response):
+        if not get_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.server_timing = get_setting('SERVER_TIMING')
+        instrument_serializers()
+
+    @contextmanager
+    def around(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            with execute_wrapper(timings.record_query):
+                yield timings, time.perf_counter()
+        finally:
+            current_timings.reset(token)
+
+    def finish(self, request, response, state):
+        timings, start = state
+        total = time.perf_counter() - start
+
+        labels = {'view': view_label(request)}
+        registry.observe('http_request_duration_seconds', labels, total)
+        registry.observe('db_query_duration_seconds', labels, timings.db)
+        registry.observe(
+            'serializer_duration_seconds', labels, timings.serializer
+        )
+        registry.observe('db_queries_per_request', labels, timings.queries)
+        registry.inc('http_requests_total', {
+            **labels, 'status': str(response.status_code)
+        })
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={timings.db * 1000:.1f};'
+                f'desc="{timings.queries} queries"',
+                f'ser;dur={timings.serializer * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_label = resolve_view_label(view_func, request.method)
+
+
+class QueryInspectorMiddleware(HybridMiddleware):
+    """
+    Режим разработки и тестов: предупреждает о N+1 с местом вызова
+    и проверяет бюджет SQL-запросов обработчика. При
+    RAISE_ON_BUDGET превышение бюджета — исключение, и тест падает.
+    """
+
+    def __init__(self, get_response):
+        if not get_inspector_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.threshold = get_inspector_setting('N_PLUS_ONE_THRESHOLD')
+        self.raise_on_budget = get_inspector_setting('RAISE_ON_BUDGET')
+
+    @contextmanager
+    def around(self, request):
+        inspector = QueryInspector()
+        with execute_wrapper(inspector):
+            yield inspector
+
+    def finish(self, request, response, inspector):
+        label = view_label(request)
+        for sql, count, site in inspector.repeated(self.threshold):
+            logger.warning(
+                'N+1 в %s: %d одинаковых запросов из %s: %s',
+                label, count, site, sql
+            )
+
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and inspector.total > budget:
+            message = (
+                f'{label}: {inspector.total} SQL-запросов '
+                f'при бюджете {budget}'
+            )
+            if self.raise_on_budget:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_label = resolve_view_label(view_func, request.method)
+        request.query_budget = query_budget(
+            view_func, request.view_label, request.method
+        )
+
+
+class SlowQueryMiddleware(HybridMiddleware):
+    """
+    Журнал медленных SQL-запросов: всё, что дольше THRESHOLD_MS,
+    пишется в логгер api.slow_queries с планом EXPLAIN и считается
+    в db_slow_queries_total.
+    """
+
+    def __init__(self, get_response):
+        if not get_slow_query_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.threshold = get_slow_query_setting('THRESHOLD_MS')
+        self.explain = get_slow_query_setting('EXPLAIN')
+
+    @contextmanager
+    def around(self, request):
+        with execute_wrapper(
+            SlowQueryLog(request, self.threshold, self.explain)
+        ):
+            yield
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_label = resolve_view_label(view_func, request.method)
+
+
+class DeadlineMiddleware(HybridMiddleware):
+    """
+    Срок обработки запроса и statement_timeout для его SQL-запросов
+    (см. api.deadlines).
+    """
+
+    def __init__(self, get_response):
+        if not get_deadline_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def around(self, request):
+        with execute_wrapper(RequestDeadline(request, time.monotonic())):
+            yield
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_label = resolve_view_label(view_func, request.method)
+        request.deadline_ms = view_deadline(
+            view_func, request.view_label, request.method
+        )
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """
+    Безопасные запросы API читают с реплик, остальные — из основной
+    БД. Успешная запись закрепляет пользователя за основной БД
+    на PIN_SECONDS (метка в общем кэше, видна всем воркерам).
+    """
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.paths = tuple(get_replica_setting('PATHS'))
+        self.pin_seconds = get_replica_setting('PIN_SECONDS')
+        self.read_only_paths = tuple(get_replica_setting('READ_ONLY_PATHS'))
+
+    @contextmanager
+    def around(self, request):
+        if not request.path.startswith(self.paths):
+            yield None
+            return
+        key = pin_key(request)
+        safe = (
+            request.method in SAFE_METHODS
+            or request.path in self.read_only_paths
+        )
+        primary = not safe or (key is not None and cache.get(key, False))
+        token = read_from_primary.set(primary)
+        try:
+            yield key if not safe else None
+        finally:
+            read_from_primary.reset(token)
+
+    def finish(self, request, response, key):
+        # key есть только у записи от опознанного пользователя.
+        if key is not None and response.status_code < 400:
+            cache.set(key, True, self.pin_seconds)
+        return response
+
+
+class CompressionMiddleware(HybridMiddleware):
+    """
+    gzip для ответов API не короче MIN_LENGTH байт, если клиент его
+    принимает; потоковые ответы отдаются как есть.
+
+    Сжимаются только адреса PATH_PREFIX и не HTML: сжатая страница
+    с CSRF-токеном (админка, Browsable API) открыта атаке BREACH,
+    а Django 3.2 не маскирует токен заново в каждом ответе. По той
+    же причине не сжимается ответ, выставляющий CSRF-cookie.
+    """
+
+    def __init__(self, get_response):
+        if not get_compression_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.min_length = get_compression_setting('MIN_LENGTH')
+        self.path_prefix = get_compression_setting('PATH_PREFIX')
+        self.gzip = GZipMiddleware(get_response)
+
+    def finish(self, request, response, state):
+        if (
+            response.streaming
+            or not request.path.startswith(self.path_prefix)
+            or response.get('Content-Type', '').startswith('text/html')
+            or settings.CSRF_COOKIE_NAME in response.cookies
+            or len(response.content) < self.min_length
+        ):
+            return response
+        return self.gzip.process_response(request, response)
+
+
+class RateLimitMiddleware(HybridMiddleware):
+    """
+    Заголовки RateLimit-* по самому строгому лимиту запроса
+    (см. api.throttling).
+    """
+
+    def finish(self, request, response, state):
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            limit, remaining, reset = rate_limit
+            response['RateLimit-Limit'] = str(limit)
+            response['RateLimit-Remaining'] = str(remaining)
+            response['RateLimit-Reset'] = str(reset)
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Профилирование запроса сотрудника с заголовком X-Profile или
+    параметром ?_profile=1. Для остальных запросов — одна проверка
+    заголовка, без обращений к БД.
+    """
+
+    def __init__(self, get_response):
+        if not get_profiler_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + get_profiler_setting(
+            'HEADER'
+        ).upper().replace('-', '_')
+        self.query_param = get_profiler_setting('QUERY_PARAM')
+
+    def _is_staff(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        # API работает по токену, а DRF проверяет его только во view.
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != b'token':
+            return False
+        return Token.objects.filter(
+            key=auth[1].decode(errors='ignore'),
+            user__is_active=True,
+            user__is_staff=True,
+        ).exists()
+
+    def __call__(self, request):
+        if not (request.META.get(self.header)
+                or request.GET.get(self.query_param)):
+            return self.get_response(request)
+        if not self._is_staff(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        response = profiler.runcall(self.get_response, request)
+        name = save_profile(
+            profiler,
+            label=view_label(request),
+            duration=time.perf_counter() - start
+        )
+        response['X-Profile-Dump'] = name
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_label = resolve_view_label(view_func, request.method)
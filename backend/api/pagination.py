@@ -1,7 +1,17 @@
 from rest_framework.pagination import PageNumberPagination
 
+from recipes.counts import EstimatedCountPaginator, get_setting
+
 
 class UserSubscrRecipePagination(PageNumberPagination):
+    """
+    При APPROXIMATE_COUNTS['ENABLED'] count в ответе для больших
+    выборок — оценка (см. recipes.counts), формат ответа прежний.
+    """
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 10
+
+    def __init__(self):
+        if get_setting('ENABLED'):
+            self.django_paginator_class = EstimatedCountPaginator
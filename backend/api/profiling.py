@@ -0,0 +1,79 @@
+"""
+Профилирование отдельных запросов по требованию сотрудника.
+
+Дампы cProfile складываются в каталог PROFILER['DIR'], который
+работает как кольцевой буфер: хранится не больше MAX_DUMPS последних
+файлов. Открываются они через pstats или snakeviz.
+"""
+from datetime import datetime
+import os
+from pathlib import Path
+import re
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': False,
+    'DIR': None,
+    'MAX_DUMPS': 20,
+    'HEADER': 'X-Profile',
+    'QUERY_PARAM': '_profile',
+}
+
+DUMP_NAME = re.compile(r'^[\w.-]+\.prof$')
+
+
+def get_setting(name):
+    return getattr(settings, 'PROFILER', {}).get(name, DEFAULTS[name])
+
+
+def dump_dir():
+    directory = Path(
+        get_setting('DIR') or Path(settings.BASE_DIR) / 'profiles'
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def save_profile(profiler, label, duration):
+    """
+    Записать дамп и удалить самые старые сверх MAX_DUMPS.
+    """
+    directory = dump_dir()
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    label = re.sub(r'[^\w.-]', '_', label)
+    name = f'{stamp}-{label}-{int(duration * 1000)}ms.prof'
+    profiler.dump_stats(directory / name)
+
+    dumps = sorted(directory.glob('*.prof'), key=os.path.getmtime)
+    for path in dumps[:-get_setting('MAX_DUMPS')]:
+        path.unlink(missing_ok=True)
+    return name
+
+
+def list_dumps():
+    return sorted(
+        (
+            {
+                'name': path.name,
+                'size': stat.st_size,
+                'created': datetime.fromtimestamp(stat.st_mtime),
+            }
+            for path, stat in (
+                (path, path.stat()) for path in dump_dir().glob('*.prof')
+            )
+        ),
+        key=lambda dump: dump['created'],
+        reverse=True
+    )
+
+
+def dump_path(name):
+    """
+    Путь к дампу по имени или None. Имя проверяется, чтобы нельзя
+    было выйти за пределы каталога.
+    """
+    if not DUMP_NAME.match(name):
+        return None
+    path = dump_dir() / name
+    return path if path.is_file() else None
@@ -0,0 +1,141 @@
+"""
+Поиск N+1 и контроль бюджета SQL-запросов для режима разработки
+и тестов.
+
+Каждый запрос к БД сводится к отпечатку — тексту SQL без литералов
+и с IN-списками любой длины, приведёнными к одному виду. Повторение
+одного отпечатка за HTTP-запрос — признак N+1; для него запоминается
+место в коде проекта, откуда запрос пришёл, например
+RecipeListSerializer.get_is_favorited.
+"""
+from collections import Counter
+import os
+import re
+import sys
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': False,
+    'N_PLUS_ONE_THRESHOLD': 3,
+    'RAISE_ON_BUDGET': False,
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+# Служебные команды транзакций повторяются законно.
+_TRANSACTION = re.compile(
+    r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE
+)
+
+PROJECT_DIR = str(settings.BASE_DIR) + os.sep
+PROJECT_APPS = ('api', 'recipes')
+SKIP_FILES = tuple(
+    os.path.join(PROJECT_DIR, 'api', name)
+    for name in (
+        'queryinspector.py', 'middleware.py', 'metrics.py', 'aio.py',
+        'deadlines.py',
+    )
+)
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Обработчик выполнил больше SQL-запросов, чем ему разрешено.
+    """
+
+
+def get_setting(name):
+    return getattr(settings, 'QUERY_INSPECTOR', {}).get(name, DEFAULTS[name])
+
+
+def fingerprint(sql):
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def call_site():
+    """
+    Ближайшее к запросу место в проекте: Класс.метод (файл:строка).
+
+    Подходит кадр из файла проекта либо метод объекта класса проекта:
+    запросы вложенных сериализаторов идут из кода DRF, и тогда
+    полезнее имя сериализатора, чем строка внутри rest_framework.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(SKIP_FILES):
+            frame = frame.f_back
+            continue
+        owner = frame.f_locals.get('self')
+        in_project = (
+            filename.startswith(PROJECT_DIR)
+            and 'site-packages' not in filename
+        )
+        if in_project or (
+            owner is not None
+            and type(owner).__module__.split('.')[0] in PROJECT_APPS
+        ):
+            name = frame.f_code.co_name
+            if owner is not None:
+                name = f'{type(owner).__name__}.{name}'
+            path = (
+                os.path.relpath(filename, PROJECT_DIR) if in_project
+                else os.path.basename(filename)
+            )
+            return f'{name} ({path}:{frame.f_lineno})'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryInspector:
+    """
+    Отпечатки SQL одного HTTP-запроса.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.fingerprints = Counter()
+        self.sites = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        if _TRANSACTION.match(sql):
+            return execute(sql, params, many, context)
+        key = fingerprint(sql)
+        self.fingerprints[key] += 1
+        if self.fingerprints[key] == 2:
+            # Место вызова ищем только для повторов: обход стека дорогой.
+            self.sites[key] = call_site()
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """
+        [(отпечаток, сколько раз, место вызова)] для кандидатов в N+1.
+        """
+        return [
+            (key, count, self.sites.get(key, 'unknown'))
+            for key, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+
+def query_budget(view_func, label, method):
+    """
+    Бюджет обработчика: QUERY_BUDGETS из настроек или атрибут
+    query_budget вьюсета — число либо словарь {action: число}.
+    """
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if label in budgets:
+        return budgets[label]
+    cls = getattr(view_func, 'cls', None)
+    budget = getattr(cls, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        return budget.get(actions.get(method.lower()))
+    return budget
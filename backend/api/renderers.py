@@ -0,0 +1,64 @@
+"""
+Двоичный формат ответов и сжатие.
+
+MessagePack выбирается заголовком Accept: application/msgpack
+(или ?format=msgpack), тела запросов в нём принимаются
+с Content-Type: application/msgpack. Формат необязательный:
+без пакета msgpack классы в настройки DRF не попадают
+(см. REST_FRAMEWORK в settings), а JSON остаётся форматом
+по умолчанию.
+
+Сжатие ответов — api.middleware.CompressionMiddleware: gzip
+для ответов API не короче COMPRESSION['MIN_LENGTH'] байт, короткие
+ответы сжимать дороже, чем передать как есть.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MIN_LENGTH': 1024,
+    'PATH_PREFIX': '/api/',
+}
+
+MEDIA_TYPE = 'application/msgpack'
+
+
+def get_setting(name):
+    return getattr(settings, 'COMPRESSION', {}).get(name, DEFAULTS[name])
+
+
+# Даты, Decimal, ленивые строки и прочее — так же, как в JSONRenderer.
+_encode_default = JSONEncoder().default
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(
+            data, default=_encode_default, use_bin_type=True
+        )
+
+
+class MessagePackParser(BaseParser):
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException):
+            raise ParseError('Ошибка разбора MessagePack.')
@@ -0,0 +1,119 @@
+"""
+Смесь запросов для повторного прогона: Postman-коллекция и JSONL-файлы
+вида {"method", "url", "auth", "weight"}. Переменные в адресах
+записываются как в Postman: {{firstRecipeId}}.
+
+Используется командами benchmark и index_advisor.
+"""
+import json
+from pathlib import Path
+import re
+from urllib.parse import parse_qsl, urlsplit
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+
+DEFAULT_SOURCES = (
+    Path(settings.BASE_DIR) / 'benchmarks' / 'requests.jsonl',
+    Path(settings.BASE_DIR).parent
+    / 'postman_collection' / 'foodgram.postman_collection.json',
+)
+
+SAFE_METHODS = ('GET', 'HEAD')
+VARIABLE = re.compile(r'{{(\w+)}}')
+
+
+def load_postman(path):
+    """
+    Безопасные запросы из Postman-коллекции. Запросы на запись
+    пропускаются: повтор меняет данные и искажает замер.
+    """
+    def walk(items):
+        for item in items:
+            if 'item' in item:
+                yield from walk(item['item'])
+                continue
+            request = item['request']
+            if request['method'] not in SAFE_METHODS:
+                continue
+            url = request['url']
+            auth = request.get('auth') or {}
+            yield {
+                'method': request['method'],
+                'url': url['raw'] if isinstance(url, dict) else url,
+                'auth': auth.get('type') == 'apikey',
+                'weight': 1,
+            }
+
+    return list(walk(json.loads(Path(path).read_text())['item']))
+
+
+def load_jsonl(path):
+    with open(path, encoding='utf-8') as source:
+        return [
+            {'auth': False, 'weight': 1, **json.loads(line)}
+            for line in source if line.strip()
+        ]
+
+
+def endpoint_name(method, url, auth):
+    """
+    GET /api/recipes/{id}/ — id в пути и значения параметров
+    отбрасываются, чтобы запросы группировались по эндпоинту.
+    """
+    parts = urlsplit(url.replace('{{baseUrl}}', ''))
+    path = re.sub(r'/(\d+|{{\w+}})(?=/)', '/{id}', parts.path)
+    params = sorted({key for key, _ in parse_qsl(parts.query)})
+    name = f'{method} {path}'
+    if params:
+        name += '?' + '&'.join(params)
+    return name + (' [auth]' if auth else '')
+
+
+def load_sources(paths):
+    mix = []
+    for path in paths:
+        path = Path(path)
+        mix += (
+            load_jsonl(path) if path.suffix == '.jsonl'
+            else load_postman(path)
+        )
+    return mix
+
+
+def substitute(url, variables):
+    """
+    Подставить переменные; None, если для какой-то нет значения.
+    """
+    names = VARIABLE.findall(url)
+    if not set(names) <= set(variables):
+        return None
+    return VARIABLE.sub(
+        lambda match: str(variables[match.group(1)]()), url
+    )
+
+
+def first_letters(ingredient_ids):
+    """
+    Первые буквы названий продуктов — для поиска ?name=.
+    """
+    return sorted({
+        name[0].lower() for name in Ingredient.objects.filter(
+            id__in=ingredient_ids
+        ).values_list('name', flat=True)
+    })
+
+
+def variables(data, rng):
+    """
+    Переменные коллекции. data — id пользователей, рецептов, продуктов
+    и буквы для поиска продуктов; значения выбираются случайно.
+    """
+    return {
+        'baseUrl': lambda: '',
+        'userId': lambda: rng.choice(data['users']),
+        'firstRecipeId': lambda: rng.choice(data['recipes']),
+        'firstIndredientId': lambda: rng.choice(data['ingredients']),
+        'ingredientNameFirstLatter': lambda: rng.choice(data['letters']),
+    }
@@ -1,14 +1,20 @@
+from django.db import transaction
 from rest_framework import serializers
 
 from djoser.serializers import (
     UserSerializer as DjoserUserSerializer,)
 
+from .batch import get_setting as get_batch_setting
+from .indexes import ingredient_index
 from .utils import Base64ImageField
 from recipes.models import (
     RecipeIngredient,
     Ingredient,
     Recipe,
 )
+from recipes.sharepages import invalidate as invalidate_share_page
+from recipes.similarity import update_signature
+from recipes.stats import track_ingredients
 
 from django.contrib.auth import get_user_model
 User = get_user_model()
@@ -184,6 +190,72 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class PantryQuerySerializer(serializers.Serializer):
+    """
+    Параметры подбора рецептов по продуктам, которые есть дома.
+    GET /api/recipes/pantry/?ingredients=1,5,9&min_coverage=0.5
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=0
+    )
+
+    def to_internal_value(self, data):
+        # Список id приходит одной строкой через запятую.
+        params = {
+            'ingredients': [
+                pk for pk in data.get('ingredients', '').split(',') if pk
+            ],
+        }
+        if 'min_coverage' in data:
+            params['min_coverage'] = data['min_coverage']
+        return super().to_internal_value(params)
+
+
+class PantryRecipeSerializer(RecipeMinifiedSerializer):
+    """
+    Рецепт с долей имеющихся продуктов и списком недостающих.
+    """
+    coverage = serializers.FloatField(read_only=True)
+    missing_ingredients = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipeMinifiedSerializer.Meta):
+        fields = RecipeMinifiedSerializer.Meta.fields + (
+            'coverage', 'missing_ingredients',
+        )
+        read_only_fields = fields
+
+
+class SimilarRecipeSerializer(RecipeMinifiedSerializer):
+    """
+    Похожий рецепт с коэффициентом Жаккара по ингредиентам.
+    GET /api/recipes/{id}/similar/
+    """
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeMinifiedSerializer.Meta):
+        fields = RecipeMinifiedSerializer.Meta.fields + ('similarity',)
+        read_only_fields = fields
+
+
+class PopularRecipeSerializer(RecipeMinifiedSerializer):
+    """
+    Рецепт из рейтинга популярных.
+    GET /api/recipes/popular/?window=day|week|all
+    """
+    favorites_count = serializers.IntegerField(read_only=True)
+    carts_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeMinifiedSerializer.Meta):
+        fields = RecipeMinifiedSerializer.Meta.fields + (
+            'favorites_count', 'carts_count',
+        )
+        read_only_fields = fields
+
+
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """
     Создание / обновление рецепта.
@@ -200,6 +272,9 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         )
 
     def _save_ingredients(self, recipe, ingredients_data):
+        old_ids = list(
+            recipe.recipeingredients.values_list('ingredient_id', flat=True)
+        )
         recipe.recipeingredients.all().delete()
         RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
@@ -209,6 +284,13 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             )
             for item in ingredients_data
         )
+        ingredient_ids = [item['ingredient'].id for item in ingredients_data]
+        transaction.on_commit(
+            lambda: ingredient_index.update_recipe(recipe.pk, ingredient_ids)
+        )
+        transaction.on_commit(lambda: invalidate_share_page(recipe.pk))
+        update_signature(recipe.pk, ingredient_ids)
+        track_ingredients(recipe.author_id, old_ids, ingredient_ids)
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
@@ -239,3 +321,23 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                 'ingredients': 'Это поле обязательно при обновлении.'
             })
         return attrs
+
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=('GET',), default='GET')
+    url = serializers.CharField(max_length=2048)
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    POST /api/batch/ — {"requests": [{"url": "/api/recipes/1/"}, ...]}
+    """
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        limit = get_batch_setting('MAX_REQUESTS')
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'Не больше {limit} запросов в пакете.'
+            )
+        return value
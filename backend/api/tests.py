@@ -0,0 +1,225 @@
+from datetime import timedelta
+from io import StringIO
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes import fakedata
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeEvent,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from recipes.popularity import refresh
+
+from .deadlines import _set_statement_timeout, statement_timeout_ms
+from .events import DatabaseBroker
+from .indexes import ingredient_index
+from .queryinspector import QueryBudgetExceeded
+from .throttling import check_throttle_costs, retry_after
+
+INSPECTOR = {
+    'ENABLED': True,
+    'N_PLUS_ONE_THRESHOLD': 3,
+    'RAISE_ON_BUDGET': True,
+}
+
+
+@override_settings(QUERY_INSPECTOR=INSPECTOR)
+class QueryBudgetTest(TestCase):
+    """
+    Бюджеты query_budget вьюсетов при максимальном размере страницы
+    и холодном кэше: превышение — QueryBudgetExceeded и падение теста.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = fakedata.seed(scale=2)
+        # Старше SETTLE_SECONDS, иначе refresh() их ещё не учтёт.
+        day_ago = timezone.now() - timedelta(days=1)
+        for model in (Favorite, ShoppingCart):
+            model.objects.update(added_at=day_ago)
+        # У случайных наборов продуктов похожих почти нет: второй
+        # рецепт получает продукты первого.
+        first, second = cls.data['recipes'][:2]
+        RecipeIngredient.objects.filter(recipe_id=second).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=second, ingredient_id=item.ingredient_id,
+                amount=item.amount
+            )
+            for item in RecipeIngredient.objects.filter(recipe_id=first)
+        )
+        call_command(
+            'rebuild_similarity_index', processes=1, stdout=StringIO()
+        )
+        refresh()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.data["tokens"][0]}'
+        )
+
+    def urls(self):
+        user = self.data['users'][1]
+        recipe = Recipe.objects.get(pk=self.data['recipes'][0])
+        pantry = ','.join(str(pk) for pk in self.data['ingredients'][:30])
+        return {
+            'UserViewSet.list': '/api/users/?limit=10',
+            'UserViewSet.retrieve': f'/api/users/{user}/',
+            'UserViewSet.me': '/api/users/me/',
+            'UserViewSet.list_subscriptions':
+                '/api/users/subscriptions/?limit=10&recipes_limit=3',
+            'UserViewSet.stats': f'/api/users/{user}/stats/',
+            'RecipeViewSet.list': '/api/recipes/?limit=10',
+            'RecipeViewSet.retrieve': f'/api/recipes/{recipe.pk}/',
+            'RecipeViewSet.download_shopping_cart':
+                '/api/recipes/download_shopping_cart/',
+            'RecipeViewSet.pantry':
+                f'/api/recipes/pantry/?ingredients={pantry}&limit=10',
+            'RecipeViewSet.similar':
+                f'/api/recipes/{recipe.pk}/similar/?limit=20',
+            'RecipeViewSet.popular': '/api/recipes/popular/?limit=10',
+            'IngredientViewSet.list': '/api/ingredients/?name=продукт',
+        }
+
+    def test_declared_budgets(self):
+        for label, url in self.urls().items():
+            with self.subTest(label):
+                # Холодный старт: пустой кэш и непостроенный индекс.
+                cache.clear()
+                ingredient_index._version = None
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, url)
+
+    def test_budget_exceeded_raises(self):
+        with override_settings(QUERY_BUDGETS={'RecipeViewSet.list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                APIClient().get('/api/recipes/')
+
+
+@override_settings(APPROXIMATE_COUNTS={'ENABLED': True, 'EXACT_BELOW': 1})
+class ApproximateCountTest(TestCase):
+    """
+    Режим оценки числа строк и обработчики, которые разбивают
+    на страницы списки, а не выборки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = fakedata.seed()
+        day_ago = timezone.now() - timedelta(days=1)
+        for model in (Favorite, ShoppingCart):
+            model.objects.update(added_at=day_ago)
+        refresh()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_backed_pagination(self):
+        pantry = ','.join(str(pk) for pk in self.data['ingredients'][:30])
+        for url in (
+            f'/api/recipes/pantry/?ingredients={pantry}',
+            '/api/recipes/popular/?window=all',
+            '/api/recipes/',
+        ):
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(response.data['count'], 0)
+
+
+class ThrottleCostTest(TestCase):
+    """
+    Действие дороже лимита области: ожидание без деления на ноль
+    и ошибка проверки настроек.
+    """
+
+    def test_retry_after_empty_window(self):
+        self.assertEqual(retry_after(5, 60, 10, 0, 0, 10), 60)
+
+    def test_cost_above_limit_is_reported(self):
+        rates = {'user': '600/m', 'shopping_cart': '5/h'}
+        with override_settings(
+            REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': rates}
+        ):
+            errors = check_throttle_costs(None)
+        self.assertEqual([error.id for error in errors], ['api.E002'])
+
+
+@override_settings(RECIPE_EVENTS={
+    'POLL_INTERVAL': 0.05, 'RETENTION': 60, 'PRUNE_INTERVAL': 0.1,
+})
+class RecipeEventPruneTest(TransactionTestCase):
+    """
+    Поток опроса DatabaseBroker удаляет устаревшие события
+    не только при старте, но и пока работает.
+    """
+
+    def setUp(self):
+        self.broker = DatabaseBroker()
+        self.broker.ready()
+        self.addCleanup(self.broker.stop)
+
+    def wait(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            time.sleep(0.05)
+
+    def test_old_events_are_pruned_while_polling(self):
+        # Первая очистка при старте уже прошла.
+        self.wait(lambda: self.broker._next_prune)
+        self.broker.publish(['user:1'], 'recipe', {})
+        RecipeEvent.objects.update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+        fresh = self.broker.publish(['user:1'], 'recipe', {})
+        self.wait(lambda: RecipeEvent.objects.count() == 1)
+        self.assertEqual(
+            list(RecipeEvent.objects.values_list('id', flat=True)), [fresh]
+        )
+
+
+class StatementTimeoutTest(TestCase):
+    """
+    statement_timeout PostgreSQL: остаток срока по ступеням и SET LOCAL
+    без запоминания внутри transaction.atomic().
+    """
+
+    def connection(self):
+        raw = mock.MagicMock()
+        execute = raw.cursor.return_value.__enter__.return_value.execute
+        return SimpleNamespace(connection=raw, in_atomic_block=False), execute
+
+    def test_timeout_follows_remaining_time(self):
+        self.assertEqual(statement_timeout_ms(2000, 1999), 2000)
+        self.assertEqual(statement_timeout_ms(2000, 900), 1000)
+        self.assertEqual(statement_timeout_ms(2000, 1), 500)
+
+    def test_set_only_on_change(self):
+        connection, execute = self.connection()
+        _set_statement_timeout(connection, 500)
+        _set_statement_timeout(connection, 500)
+        self.assertEqual(execute.call_count, 1)
+
+    def test_atomic_block_is_not_remembered(self):
+        connection, execute = self.connection()
+        connection.in_atomic_block = True
+        _set_statement_timeout(connection, 500)
+        # Транзакция откатилась: значение сессии снова прежнее.
+        connection.in_atomic_block = False
+        _set_statement_timeout(connection, 500)
+        self.assertEqual([call.args for call in execute.call_args_list], [
+            ('SET LOCAL statement_timeout = %s', [500]),
+            ('SET statement_timeout = %s', [500]),
+        ])
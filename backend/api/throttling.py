@@ -0,0 +1,231 @@
+"""
+Ограничение частоты запросов скользящим окном.
+
+Лимиты задаются в REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']:
+'user' и 'anon' — общий лимит на пользователя (анонимов — на IP),
+остальные ключи — лимиты эндпоинтов, которые вьюсет выбирает
+атрибутом throttle_scope. Формат — 'число/период': '10/m', '300/h',
+'50/15m'. Скоупа без лимита в настройках нет ограничения.
+
+Каждый запрос расходует из окна throttle_cost единиц (по умолчанию 1),
+у тяжёлых действий стоимость выше. throttle_scope и throttle_cost
+у вьюсета — значение или словарь {action: значение}, как query_budget.
+
+Счётчики хранятся в кэше THROTTLING['CACHE'], окно — два соседних
+интервала: текущий и предыдущий с весом оставшейся в окне доли.
+Чтобы лимиты действовали на все воркеры gunicorn, кэш должен быть
+общим (memcached, redis), иначе у каждого процесса свои счётчики.
+
+Ответ 429 получает Retry-After (DRF), все ответы с лимитом —
+заголовки RateLimit-Limit, RateLimit-Remaining и RateLimit-Reset
+(см. api.middleware.RateLimitMiddleware).
+"""
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'KEY_PREFIX': 'throttle',
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE_RE = re.compile(r'(\d+)/(\d*)([smhd])\w*')
+
+
+def get_setting(name):
+    return getattr(settings, 'THROTTLING', {}).get(name, DEFAULTS[name])
+
+
+def parse_rate(rate):
+    """
+    '50/15m' -> (50, 900): лимит и длина окна в секундах.
+    """
+    match = RATE_RE.fullmatch(rate)
+    if match is None:
+        raise ImproperlyConfigured(f'Неверный лимит запросов: {rate!r}')
+    limit, multiplier, period = match.groups()
+    return int(limit), int(multiplier or 1) * PERIODS[period]
+
+
+def per_action(view, attribute, default=None):
+    value = getattr(view, attribute, default)
+    if isinstance(value, dict):
+        return value.get(getattr(view, 'action', None), default)
+    return value
+
+
+def _incr(cache, key, delta, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Ключ истёк между add и incr.
+        cache.set(key, delta, timeout)
+        return delta
+
+
+def retry_after(limit, window, elapsed, previous, current, cost):
+    """
+    Через сколько секунд запрос стоимостью cost уложится в лимит,
+    если новых запросов не будет.
+    """
+    # В текущем интервале вес предыдущего падает до нуля.
+    free = limit - current - cost
+    if free >= 0:
+        return window * (1 - free / previous) - elapsed
+    # Дальше текущий интервал становится предыдущим.
+    free = limit - cost
+    if current <= free:
+        return window - elapsed
+    if current == 0:
+        # Стоимость больше лимита: запрос не уложится никогда,
+        # клиенту — целое окно (см. также check_throttle_costs).
+        return window
+    return window - elapsed + window * min(1 - free / current, 1)
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Лимит скоупа get_scope() на клиента get_client(). Подклассы
+    определяют скоуп; лимит берётся из DEFAULT_THROTTLE_RATES.
+    """
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_scope(self, request, view):
+        raise NotImplementedError
+
+    def get_rate(self, scope):
+        rates = getattr(settings, 'REST_FRAMEWORK', {}).get(
+            'DEFAULT_THROTTLE_RATES', {}
+        )
+        return rates.get(scope)
+
+    def get_client(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = self.get_rate(scope) if scope else None
+        if rate is None:
+            return True
+        limit, window = parse_rate(rate)
+        cost = per_action(view, 'throttle_cost', 1)
+
+        now = time.time()
+        interval, elapsed = divmod(now, window)
+        key = (
+            f'{get_setting("KEY_PREFIX")}:{scope}:'
+            f'{self.get_client(request)}:{window}:'
+        )
+        cache = caches[get_setting('CACHE')]
+        # Стоимость списывается сразу и возвращается при отказе:
+        # параллельные запросы из разных воркеров не превысят лимит.
+        current = _incr(cache, f'{key}{interval:.0f}', cost, window * 2)
+        previous = cache.get(f'{key}{interval - 1:.0f}', 0)
+        weight = 1 - elapsed / window
+        used = previous * weight + current
+        allowed = used <= limit
+        if not allowed:
+            try:
+                cache.decr(f'{key}{interval:.0f}', cost)
+            except ValueError:
+                pass
+            current -= cost
+            used -= cost
+            self.wait_seconds = retry_after(
+                limit, window, elapsed, previous, current, cost
+            )
+            registry.inc('throttled_requests_total', {'scope': scope})
+        self._remember(request, limit, max(limit - used, 0), window - elapsed)
+        return allowed
+
+    def _remember(self, request, limit, remaining, reset):
+        """
+        Самый строгий из лимитов запроса — для заголовков RateLimit-*.
+        """
+        django_request = request._request
+        known = getattr(django_request, 'rate_limit', None)
+        if known is None or remaining < known[1]:
+            django_request.rate_limit = (
+                limit, math.floor(remaining), math.ceil(reset)
+            )
+
+    def wait(self):
+        if self.wait_seconds is None:
+            return None
+        return math.ceil(self.wait_seconds)
+
+
+class UserRateThrottle(SlidingWindowThrottle):
+    """
+    Общий лимит: 'user' для пользователей, 'anon' для анонимов.
+    """
+
+    def get_scope(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return 'user'
+        return 'anon'
+
+
+class EndpointRateThrottle(SlidingWindowThrottle):
+    """
+    Лимит эндпоинта по атрибуту throttle_scope вьюсета.
+    """
+
+    def get_scope(self, request, view):
+        return per_action(view, 'throttle_scope')
+
+
+def check_throttle_costs(app_configs, **kwargs):
+    """
+    Проверка настроек (manage.py check): формат лимитов и стоимость
+    действий не больше лимитов, которые к ним применяются, — иначе
+    запрос отклонялся бы всегда.
+    """
+    from .urls import router
+
+    rates = getattr(settings, 'REST_FRAMEWORK', {}).get(
+        'DEFAULT_THROTTLE_RATES', {}
+    )
+    errors = []
+    limits = {}
+    for scope, rate in rates.items():
+        if rate is None:
+            continue
+        try:
+            limits[scope] = parse_rate(rate)[0]
+        except ImproperlyConfigured as error:
+            errors.append(Error(str(error), id='api.E001'))
+    for _, viewset, _ in router.registry:
+        costs = getattr(viewset, 'throttle_cost', 1)
+        if not isinstance(costs, dict):
+            costs = {None: costs}
+        for action, cost in costs.items():
+            scope = getattr(viewset, 'throttle_scope', None)
+            if isinstance(scope, dict):
+                scope = scope.get(action)
+            for name in ('user', 'anon', scope):
+                if name in limits and cost > limits[name]:
+                    errors.append(Error(
+                        f'Стоимость {viewset.__name__}.{action or "*"} '
+                        f'({cost}) больше лимита {name!r} '
+                        f'({limits[name]}).',
+                        hint='Уменьшите throttle_cost или увеличьте '
+                             'лимит в DEFAULT_THROTTLE_RATES.',
+                        obj=viewset,
+                        id='api.E002',
+                    ))
+    return errors
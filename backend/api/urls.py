@@ -1,6 +1,9 @@
 from django.urls import include, path
 
+from .aio import async_view, get_setting as get_async_setting
 from .views import (
+    BatchViewSet,
+    ProfileDumpViewSet,
     IngredientViewSet,
     RecipeViewSet,
     UserViewSet,
@@ -13,6 +16,8 @@ router = DefaultRouter()
 router.register(r'recipes', RecipeViewSet, basename='recipe')
 router.register(r'users', UserViewSet, basename='users')
 router.register(r'ingredients', IngredientViewSet, basename='ingredient')
+router.register(r'profiles', ProfileDumpViewSet, basename='profile')
+router.register(r'batch', BatchViewSet, basename='batch')
 
 urlpatterns = [
 
@@ -22,3 +27,27 @@ urlpatterns = [
     path('', include(router.urls)),
 
 ]
+
+if get_async_setting('ENABLED'):
+    # Асинхронные варианты горячих эндпоинтов стоят раньше маршрутов
+    # роутера и обслуживают те же адреса и методы.
+    urlpatterns = [
+        path('recipes/', async_view(
+            RecipeViewSet, {'get': 'list', 'post': 'create'}
+        ), name='recipe-list'),
+        path('recipes/<int:pk>/', async_view(RecipeViewSet, {
+            'get': 'retrieve',
+            'put': 'update',
+            'patch': 'partial_update',
+            'delete': 'destroy',
+        }), name='recipe-detail'),
+        path('ingredients/', async_view(
+            IngredientViewSet, {'get': 'list'}
+        ), name='ingredient-list'),
+        path('ingredients/<int:pk>/', async_view(
+            IngredientViewSet, {'get': 'retrieve'}
+        ), name='ingredient-detail'),
+        path('users/subscriptions/', async_view(
+            UserViewSet, {'get': 'list_subscriptions'}
+        ), name='users-list-subscriptions'),
+    ] + urlpatterns
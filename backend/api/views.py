@@ -8,10 +8,12 @@ from rest_framework.decorators import action
 from rest_framework.permissions import (
     IsAuthenticatedOrReadOnly,
     IsAuthenticated,
+    IsAdminUser,
     AllowAny,
 )
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse
+from django.http import FileResponse, Http404, HttpResponse
+from django.db import transaction
 from django.db.models import Sum, F
 from django.urls import reverse
 
@@ -19,14 +21,28 @@ from djoser.views import UserViewSet as DjoserUserViewSet
 
 from .pagination import UserSubscrRecipePagination
 from .permissions import IsAuthorOrReadOnly
+from . import batch
+from .events import (
+    get_setting as get_events_setting,
+    publish_recipe,
+    stream_token,
+)
 from .filters import RecipeFilter
+from .indexes import ingredient_index
+from .metrics import registry
+from .profiling import dump_path, list_dumps
 from .serializers import (
     UserSubscriptionsListSerializer,
     RecipeCreateUpdateSerializer,
     RecipeMinifiedSerializer,
+    PantryRecipeSerializer,
+    PantryQuerySerializer,
+    SimilarRecipeSerializer,
+    PopularRecipeSerializer,
     RecipeListSerializer,
     IngredientSerializer,
     AvatarSerializer,
+    BatchSerializer,
     UserSerializer,
 )
 from recipes.models import (
@@ -37,10 +53,20 @@ from recipes.models import (
     Favorite,
     Recipe,
 )
+from recipes.popularity import WINDOWS, popular_recipes
+from recipes.shortlinks import get_or_create_link
+from recipes.similarity import similar_recipes
+from recipes.stats import author_stats, track, track_ingredients
 
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
+# Поле статистики автора, которое меняет добавление в список.
+STATS_FIELDS = {
+    Favorite: 'favorites',
+    ShoppingCart: 'carts',
+}
+
 
 # Ингредиент
 class IngredientSearchFilter(filters.SearchFilter):
@@ -59,6 +85,10 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [IngredientSearchFilter]
     search_fields = ['^name',]
     pagination_class = None
+    query_budget = 2
+    # Список без пагинации: без фильтра по имени — вся таблица.
+    throttle_scope = 'ingredients'
+    throttle_cost = {'list': 2}
 
 
 # Пользователи и подписки
@@ -77,6 +107,22 @@ class UserViewSet(DjoserUserViewSet):
     serializer_class = UserSerializer
     lookup_field = 'pk'
     lookup_value_regex = r'\d+'  # id обязательно число
+    # Бюджеты SQL-запросов при максимальном размере страницы,
+    # проверяются QueryInspectorMiddleware.
+    query_budget = {
+        'list': 13,
+        'retrieve': 3,
+        'me': 2,
+        'list_subscriptions': 33,
+        'stats': 4,
+    }
+    # Сроки обработки в мс (api.deadlines), по истечении — 503.
+    deadline_ms = {
+        'list': 3000,
+        'retrieve': 2000,
+        'list_subscriptions': 5000,
+        'stats': 3000,
+    }
 
     def get_permissions(self):
         if self.action in ('me',):
@@ -120,6 +166,7 @@ class UserViewSet(DjoserUserViewSet):
                 raise serializers.ValidationError(
                     f'Вы уже подписаны на пользователя {usr} с id = {pk}.'
                 )
+            track(author.id, followers=1)
             data = UserSubscriptionsListSerializer(
                 author,
                 context={'request': request},
@@ -133,8 +180,19 @@ class UserViewSet(DjoserUserViewSet):
             author=author
         )
         subscription.delete()
+        track(author.id, followers=-1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    # Статистика автора
+    @action(detail=True, methods=['get'], url_path='stats')
+    def stats(self, request, pk=None):
+        """
+        GET /api/users/{pk}/stats/  => итоги и история показателей автора,
+                                     самые частые продукты в его рецептах
+        """
+        author = self.get_object()
+        return Response(author_stats(author.id))
+
     # Список подписок текущего пользователя
     @action(detail=False, methods=['get'], url_path='subscriptions')
     def list_subscriptions(self, request):
@@ -157,6 +215,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
     - Рецептами
     - Списками избранного и покупок
     - Получение короткой ссылки на рецепт
+    - Подбор рецептов по имеющимся продуктам
+    - Похожие рецепты
+    - Популярные рецепты
     """
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly,
@@ -164,11 +225,52 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     pagination_class = UserSubscrRecipePagination
+    query_budget = {
+        'list': 35,
+        'retrieve': 7,
+        'download_shopping_cart': 3,
+        'pantry': 4,
+        'similar': 6,
+        'popular': 4,
+    }
+    # Лимиты частоты (api.throttling): запись с картинкой в base64
+    # и выгрузка списка покупок дороже чтения.
+    throttle_scope = {
+        'create': 'recipe_write',
+        'update': 'recipe_write',
+        'partial_update': 'recipe_write',
+        'download_shopping_cart': 'shopping_cart',
+    }
+    throttle_cost = {
+        'create': 5,
+        'update': 5,
+        'partial_update': 5,
+        'download_shopping_cart': 10,
+        'pantry': 3,
+    }
+    # Сроки обработки в мс (api.deadlines), по истечении — 503.
+    deadline_ms = {
+        'list': 3000,
+        'retrieve': 2000,
+        'download_shopping_cart': 5000,
+        'pantry': 5000,
+        'similar': 3000,
+        'popular': 3000,
+    }
+
+    def get_queryset(self):
+        recipes = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            recipes = recipes.select_related('author').prefetch_related(
+                'recipeingredients__ingredient'
+            )
+        return recipes
 
     def get_permissions(self):
         if self.action in ('favorite',
                            'shopping_cart',
-                           'download_shopping_cart',):
+                           'download_shopping_cart',
+                           'events_token',):
             return [IsAuthenticated()]
         return super().get_permissions()
 
@@ -182,8 +284,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         Получение ссылки на рецепт.
         """
+        link = get_or_create_link(self.get_object().pk)
         short_url = request.build_absolute_uri(
-            reverse('short-link-redirect', kwargs={'recipe_id': pk})
+            reverse('short-link-redirect', kwargs={'code': link.code})
         )
         return Response({'short-link': short_url})
 
@@ -196,10 +299,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         # От метода create вы написали избавиться и заменить его на
         # perform* версию.
         recipe = serializer.save(author=self.request.user)
+        track(recipe.author_id, recipes=1)
         read = RecipeListSerializer(
             recipe, context={'request': self.request}
         )
         serializer._data = read.data
+        event = {
+            **RecipeMinifiedSerializer(
+                recipe, context={'request': self.request}
+            ).data,
+            'author': recipe.author_id,
+        }
+        transaction.on_commit(lambda: publish_recipe(recipe, event))
 
     def perform_update(self, serializer):
         # Аналогично предыдущему.
@@ -211,6 +322,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.instance = recipe
         serializer._data = read.data
 
+    def perform_destroy(self, instance):
+        recipe_id = instance.pk
+        ingredient_ids = list(
+            instance.recipeingredients.values_list('ingredient_id', flat=True)
+        )
+        # Избранное и списки покупок удалятся каскадом вместе с рецептом.
+        favorites = instance.favorites.count()
+        carts = instance.shoppingcarts.count()
+        instance.delete()
+        transaction.on_commit(
+            lambda: ingredient_index.remove_recipe(recipe_id)
+        )
+        track(
+            instance.author_id,
+            recipes=-1, favorites=-favorites, carts=-carts
+        )
+        track_ingredients(instance.author_id, ingredient_ids, ())
+
     def _create_delete_favorite_shoppingcart(
         self,
         request,
@@ -232,6 +361,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 raise serializers.ValidationError(
                     f'Рецепт {recipe.name} уже находится в {model._meta.verbose_name}.'
                 )
+            track(recipe.author_id, **{STATS_FIELDS[model]: 1})
             serializer = RecipeMinifiedSerializer(
                 recipe,
                 context={'request': request}
@@ -240,6 +370,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         # request.method == 'DELETE'
         get_object_or_404(model, user=user, recipe=recipe).delete()
+        track(recipe.author_id, **{STATS_FIELDS[model]: -1})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     # Добавление / Удаление в избранном
@@ -258,6 +389,121 @@ class RecipeViewSet(viewsets.ModelViewSet):
             model=ShoppingCart
         )
 
+    # Что приготовить из имеющихся продуктов
+    @action(detail=False, methods=['get'], url_path='pantry')
+    def pantry(self, request):
+        """
+        GET /api/recipes/pantry/?ingredients=1,5,9  => рецепты по убыванию
+                                                    доли имеющихся продуктов
+        """
+        query = PantryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        pantry = set(query.validated_data['ingredients'])
+
+        ranked = ingredient_index.rank_by_coverage(
+            pantry,
+            min_coverage=query.validated_data['min_coverage']
+        )
+        page = self.paginate_queryset(ranked)
+
+        # Из БД забираем только рецепты и продукты текущей страницы.
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        missing = {
+            recipe_id: [
+                pk for pk in ingredient_index.ingredients_of(recipe_id)
+                if pk not in pantry
+            ]
+            for recipe_id, _ in page
+        }
+        ingredients = Ingredient.objects.in_bulk(
+            {pk for pks in missing.values() for pk in pks}
+        )
+
+        results = []
+        for recipe_id, coverage in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = round(coverage, 4)
+            recipe.missing_ingredients = [
+                ingredients[pk] for pk in missing[recipe_id]
+                if pk in ingredients
+            ]
+            results.append(recipe)
+
+        serializer = PantryRecipeSerializer(
+            results, many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    # Похожие рецепты
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk=None):
+        """
+        GET /api/recipes/{id}/similar/?limit=6  => рецепты с самыми похожими
+                                                 наборами ингредиентов
+        """
+        recipe = self.get_object()
+        limit = request.query_params.get('limit', '')
+        limit = min(int(limit), 20) if limit.isdigit() else 6
+
+        scored = similar_recipes(recipe.pk, limit)
+        recipes = Recipe.objects.in_bulk([pk for pk, _ in scored])
+        results = []
+        for pk, similarity in scored:
+            if pk in recipes:
+                recipes[pk].similarity = round(similarity, 4)
+                results.append(recipes[pk])
+
+        serializer = SimilarRecipeSerializer(
+            results, many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
+
+    # Токен потока событий о новых рецептах
+    @action(detail=False, methods=['post'], url_path='events/token')
+    def events_token(self, request):
+        """
+        POST /api/recipes/events/token/  => подписанный токен для
+                                 /api/recipes/events/?token= (api.events)
+        """
+        return Response({
+            'token': stream_token(request.user.pk),
+            'expires_in': get_events_setting('TOKEN_MAX_AGE'),
+        })
+
+    # Популярные рецепты
+    @action(detail=False, methods=['get'], url_path='popular')
+    def popular(self, request):
+        """
+        GET /api/recipes/popular/?window=day|week|all  => рейтинг по
+                                добавлениям в избранное и список покупок
+        """
+        window = request.query_params.get('window', 'week')
+        if window not in WINDOWS:
+            raise serializers.ValidationError({
+                'window': f'Допустимые значения: {", ".join(WINDOWS)}.'
+            })
+
+        page = self.paginate_queryset(popular_recipes(window))
+        recipes = Recipe.objects.in_bulk([pk for pk, _, _ in page])
+        results = []
+        for pk, favorites, carts in page:
+            if pk in recipes:
+                recipes[pk].favorites_count = favorites
+                recipes[pk].carts_count = carts
+                results.append(recipes[pk])
+
+        serializer = PopularRecipeSerializer(
+            results, many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
     # Скачивание списка покупок
     @action(detail=False, methods=['get'], url_path='download_shopping_cart')
     def download_shopping_cart(self, request):
@@ -307,3 +553,59 @@ class RecipeViewSet(viewsets.ModelViewSet):
             filename='shopping_list.txt',
             content_type='text/plain'
         )
+
+
+# Профили запросов
+class ProfileDumpViewSet(viewsets.ViewSet):
+    """
+    Дампы профилировщика, только для сотрудников.
+    GET    /api/profiles/          => список дампов, новые первыми
+    GET    /api/profiles/{name}/   => скачать дамп (.prof для pstats)
+    """
+    permission_classes = [IsAdminUser]
+    lookup_field = 'name'
+    lookup_value_regex = r'[\w.-]+'
+
+    def list(self, request):
+        return Response(list_dumps())
+
+    def retrieve(self, request, name=None):
+        path = dump_path(name)
+        if path is None:
+            raise Http404
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=name,
+            content_type='application/octet-stream'
+        )
+
+
+# Пакетные запросы
+class BatchViewSet(viewsets.ViewSet):
+    """
+    POST /api/batch/  => ответы на несколько GET-запросов к рецептам,
+    пользователям и продуктам за один запрос:
+    {"responses": [{"status": 200, "body": {...}}, ...]}
+    """
+    permission_classes = [AllowAny]
+
+    def create(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({
+            'responses': batch.run(
+                request, serializer.validated_data['requests']
+            )
+        })
+
+
+# Метрики
+def metrics(request):
+    """
+    GET /metrics  => метрики всех воркеров в формате Prometheus.
+    """
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
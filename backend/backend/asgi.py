@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.events import event_stream, get_setting  # noqa: E402
+
+EVENTS_PATH = get_setting('PATH')
+
+
+async def application(scope, receive, send):
+    # Поток Server-Sent Events обслуживается без обработчика Django:
+    # в Django 3.2 ответ ASGI не может быть асинхронным итератором.
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await event_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
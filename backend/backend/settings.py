@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import importlib.util
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -55,12 +56,20 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.RateLimitMiddleware',
+    'api.middleware.QueryInspectorMiddleware',
+    'api.middleware.SlowQueryMiddleware',
+    'api.middleware.DeadlineMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     # 'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -89,7 +98,7 @@ if DEBUG:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3'
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3')
         }
     }
 else:
@@ -104,6 +113,33 @@ else:
         }
     }
 
+# Реплики для чтения: DB_REPLICA_HOSTS — хосты PostgreSQL через запятую,
+# в режиме DEBUG SQLITE_REPLICAS — пути к файлам SQLite. Для локальной
+# проверки достаточно копии базы: cp db.sqlite3 replica.sqlite3.
+if DEBUG:
+    REPLICA_DATABASES = [
+        {**DATABASES['default'], 'NAME': path}
+        for path in filter(None, os.getenv('SQLITE_REPLICAS', '').split(','))
+    ]
+else:
+    REPLICA_DATABASES = [
+        {**DATABASES['default'], 'HOST': host}
+        for host in filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))
+    ]
+DATABASE_REPLICAS = []
+for number, replica in enumerate(REPLICA_DATABASES, 1):
+    alias = f'replica_{number}'
+    # В тестах реплика — та же тестовая БД, что и основная.
+    DATABASES[alias] = {**replica, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['api.dbrouters.ReplicaRouter']
+# PIN_SECONDS — сколько пользователь после записи читает из основной БД.
+REPLICA_ROUTING = {
+    'PIN_SECONDS': int(os.getenv('REPLICA_PIN_SECONDS', 5)),
+    'PATHS': ('/api/',),
+    'READ_ONLY_PATHS': ('/api/batch/',),
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -154,7 +190,42 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Лимиты частоты запросов (api.throttling) в единицах стоимости:
+    # действие расходует throttle_cost вьюсета, по умолчанию 1 (не больше
+    # лимита, см. manage.py check). Адрес анонима — из X-Forwarded-For
+    # с учётом NUM_PROXIES прокси перед приложением.
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.UserRateThrottle',
+        'api.throttling.EndpointRateThrottle',
+    ) if os.getenv('THROTTLE_ENABLED', 'True') == 'True' else (),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON', '300/m'),
+        'user': os.getenv('THROTTLE_USER', '600/m'),
+        'ingredients': os.getenv('THROTTLE_INGREDIENTS', '240/m'),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', '500/h'),
+        'shopping_cart': os.getenv('THROTTLE_SHOPPING_CART', '300/h'),
+    },
+    'NUM_PROXIES': (
+        int(os.getenv('NUM_PROXIES')) if os.getenv('NUM_PROXIES') else None
+    ),
 }
+# MessagePack (Accept: application/msgpack) — если установлен msgpack.
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += (
+        'api.renderers.MessagePackRenderer',
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] += (
+        'api.renderers.MessagePackParser',
+    )
 
 DJOSER = {
     'LOGIN_FIELD': 'email',
@@ -170,3 +241,172 @@ DJOSER = {
         'user_list': ['rest_framework.permissions.AllowAny'],
     },
 }
+
+# Кэш. Для нескольких воркеров gunicorn нужен общий бэкенд
+# (memcached, файловый), иначе у каждого процесса будет свой.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Инвертированный индекс ингредиентов: принудительная перестройка
+# раз в INGREDIENT_INDEX_TTL секунд подхватывает изменения из админки.
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+# Замеры запросов: заголовок Server-Timing и гистограммы на /metrics.
+# При нескольких воркерах gunicorn METRICS_MULTIPROCESS_DIR должен
+# указывать на общий для них каталог.
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'True') == 'True',
+    'SERVER_TIMING': os.getenv('METRICS_SERVER_TIMING', 'True') == 'True',
+    'MULTIPROCESS_DIR': os.getenv('METRICS_MULTIPROCESS_DIR'),
+    'FLUSH_INTERVAL': int(os.getenv('METRICS_FLUSH_INTERVAL', 5)),
+}
+
+# Поиск N+1 и бюджеты SQL-запросов (см. query_budget у вьюсетов).
+# В тестах включать с QUERY_BUDGET_RAISE=True, на стейджинге —
+# только предупреждения в лог.
+QUERY_INSPECTOR = {
+    'ENABLED': os.getenv('QUERY_INSPECTOR_ENABLED', str(DEBUG)) == 'True',
+    'N_PLUS_ONE_THRESHOLD': int(os.getenv('QUERY_N_PLUS_ONE_THRESHOLD', 3)),
+    'RAISE_ON_BUDGET': os.getenv('QUERY_BUDGET_RAISE', 'False') == 'True',
+}
+# Переопределение бюджетов: {'RecipeViewSet.list': 35}.
+QUERY_BUDGETS = {}
+
+# Журнал медленных SQL-запросов с планами EXPLAIN
+# (логгер api.slow_queries).
+SLOW_QUERIES = {
+    'ENABLED': os.getenv('SLOW_QUERIES_ENABLED', 'False') == 'True',
+    'THRESHOLD_MS': float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200)),
+    'EXPLAIN': os.getenv('SLOW_QUERY_EXPLAIN', 'True') == 'True',
+}
+
+# Срок обработки запроса API и statement_timeout его SQL-запросов,
+# по истечении — 503. Сроки действий — deadline_ms у вьюсетов,
+# переопределения — VIEWS: {'RecipeViewSet.list': 2000}.
+REQUEST_DEADLINES = {
+    'ENABLED': os.getenv('REQUEST_DEADLINES_ENABLED', 'True') == 'True',
+    'DEFAULT_MS': int(os.getenv('REQUEST_DEADLINE_MS', 10000)),
+    'VIEWS': {},
+}
+
+# Профилирование запросов сотрудников по заголовку X-Profile
+# или параметру ?_profile=1. Дампы — /api/profiles/.
+PROFILER = {
+    'ENABLED': os.getenv('PROFILER_ENABLED', 'False') == 'True',
+    'DIR': os.getenv('PROFILER_DIR', os.path.join(BASE_DIR, 'profiles')),
+    'MAX_DUMPS': int(os.getenv('PROFILER_MAX_DUMPS', 20)),
+}
+
+# Асинхронный путь чтения для запуска под ASGI, например
+# gunicorn -k uvicorn.workers.UvicornWorker backend.asgi:
+# списки и карточки рецептов, поиск продуктов и подписки выполняются
+# в пуле из THREADS потоков, медленные клиенты не занимают воркер.
+# По умолчанию выключен: основной режим — синхронный backend.wsgi.
+ASYNC_READS = {
+    'ENABLED': os.getenv('ASYNC_READS_ENABLED', 'False') == 'True',
+    'THREADS': int(os.getenv('ASYNC_READS_THREADS', 8)),
+}
+
+# Оценка count в списках API вместо COUNT(*) на каждой странице:
+# планировщик PostgreSQL или точный подсчёт раз в CACHE_SECONDS.
+# Выборки меньше EXACT_BELOW строк всегда считаются точно.
+# Списки админки используют оценку всегда.
+APPROXIMATE_COUNTS = {
+    'ENABLED': os.getenv('APPROXIMATE_COUNTS_ENABLED', 'False') == 'True',
+    'EXACT_BELOW': int(os.getenv('APPROXIMATE_COUNTS_EXACT_BELOW', 10000)),
+    'CACHE_SECONDS': int(os.getenv('APPROXIMATE_COUNTS_CACHE_SECONDS', 300)),
+}
+
+# Короткие ссылки /s/<код>/: LRU кода → рецепта на CACHE_SIZE записей
+# в каждом процессе, неизвестные коды — на MISS_TTL секунд; счётчик
+# переходов пишется в БД пачкой. Сброс LRU после удаления доходит
+# до других процессов через общий кэш (CACHES).
+SHORT_LINKS = {
+    'CACHE_SIZE': int(os.getenv('SHORT_LINKS_CACHE_SIZE', 10000)),
+    'FLUSH_INTERVAL': int(os.getenv('SHORT_LINKS_FLUSH_INTERVAL', 10)),
+    'FLUSH_HITS': int(os.getenv('SHORT_LINKS_FLUSH_HITS', 1000)),
+    'MISS_TTL': int(os.getenv('SHORT_LINKS_MISS_TTL', 60)),
+}
+
+# Серверная страница рецепта с OpenGraph для коротких ссылок:
+# краулерам и превью мессенджеров (BOT_USER_AGENTS), с FOR_ALL — всем.
+SHARE_PAGES = {
+    'FOR_ALL': os.getenv('SHARE_PAGES_FOR_ALL', 'False') == 'True',
+    'CACHE_SECONDS': int(os.getenv('SHARE_PAGES_CACHE_SECONDS', 86400)),
+}
+
+# POST /api/batch/: до MAX_REQUESTS GET-запросов в одном пакете.
+BATCH_REQUESTS = {
+    'MAX_REQUESTS': int(os.getenv('BATCH_MAX_REQUESTS', 10)),
+}
+
+# Счётчики лимитов частоты: CACHE — алиас из CACHES. Для нескольких
+# воркеров нужен общий кэш, иначе лимит действует в каждом отдельно.
+THROTTLING = {
+    'CACHE': os.getenv('THROTTLE_CACHE', 'default'),
+}
+
+# Сжатие gzip ответов не короче MIN_LENGTH байт (JSON и MessagePack)
+# под PATH_PREFIX; HTML с CSRF-токенами не сжимается (BREACH).
+COMPRESSION = {
+    'ENABLED': os.getenv('COMPRESSION_ENABLED', 'True') == 'True',
+    'MIN_LENGTH': int(os.getenv('COMPRESSION_MIN_LENGTH', 1024)),
+    'PATH_PREFIX': '/api/',
+}
+
+# Server-Sent Events о новых рецептах подписок (только под ASGI,
+# сервис backend_events в infra/docker-compose.yml). DatabaseBroker
+# передаёт события из воркеров WSGI через таблицу RecipeEvent;
+# LocalBroker — только внутри одного процесса. Строки старше RETENTION
+# секунд поток опроса удаляет раз в PRUNE_INTERVAL секунд.
+RECIPE_EVENTS = {
+    'BROKER': os.getenv('RECIPE_EVENTS_BROKER', 'api.events.DatabaseBroker'),
+    'HEARTBEAT': int(os.getenv('RECIPE_EVENTS_HEARTBEAT', 15)),
+    'QUEUE_SIZE': int(os.getenv('RECIPE_EVENTS_QUEUE_SIZE', 100)),
+    'HISTORY': int(os.getenv('RECIPE_EVENTS_HISTORY', 1000)),
+    'POLL_INTERVAL': float(os.getenv('RECIPE_EVENTS_POLL_INTERVAL', 1)),
+    'RETENTION': int(os.getenv('RECIPE_EVENTS_RETENTION', 24 * 60 * 60)),
+    'PRUNE_INTERVAL': int(os.getenv('RECIPE_EVENTS_PRUNE_INTERVAL', 300)),
+    'TOKEN_MAX_AGE': int(os.getenv('RECIPE_EVENTS_TOKEN_MAX_AGE', 300)),
+}
+
+# Профиль развёртывания (DJANGO_PROFILE):
+# full — всё приложение, включая админку;
+# api  — только REST API: без админки, сессий, CSRF и сообщений
+#        (API авторизуется только токеном) и без Browsable API.
+# Основной пул gunicorn работает в профиле api, /admin/ nginx
+# направляет в отдельный пул с профилем full.
+PROFILE = os.getenv('DJANGO_PROFILE', 'full')
+if PROFILE == 'api':
+    INSTALLED_APPS = [
+        app for app in INSTALLED_APPS if app not in (
+            'django.contrib.admin',
+            'django.contrib.sessions',
+            'django.contrib.messages',
+        )
+    ]
+    MIDDLEWARE = [
+        middleware for middleware in MIDDLEWARE if middleware not in (
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.middleware.csrf.CsrfViewMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+            'django.middleware.clickjacking.XFrameOptionsMiddleware',
+        )
+    ]
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        'django.template.context_processors.debug',
+        'django.template.context_processors.request',
+    ]
+    ROOT_URLCONF = 'backend.urls_api'
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = tuple(
+        renderer for renderer in REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+        if renderer != 'rest_framework.renderers.BrowsableAPIRenderer'
+    )
@@ -0,0 +1,18 @@
+"""
+Адреса профиля api (DJANGO_PROFILE=api): всё, кроме админки.
+"""
+from django.urls import path, include
+from django.conf import settings
+from django.conf.urls.static import static
+
+from api.views import metrics
+
+urlpatterns = [
+    path('metrics', metrics, name='metrics'),
+    path('api/', include('api.urls')),
+    path('', include('recipes.urls')),
+]
+
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL,
+                          document_root=settings.MEDIA_ROOT)
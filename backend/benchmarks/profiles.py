@@ -0,0 +1,124 @@
+"""
+Сравнение профилей развёртывания full и api (DJANGO_PROFILE).
+
+Каждый профиль замеряется в отдельном процессе: время импорта
+и настройки Django вместе с загрузкой URLconf, память после запуска
+и время обработки запросов на тестовой SQLite-базе.
+
+    python benchmarks/profiles.py --requests 500
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+import resource
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PROFILES = ('full', 'api')
+URLS = (
+    '/api/ingredients/{ingredient}/',
+    '/api/recipes/',
+    '/api/recipes/{recipe}/',
+    '/api/users/me/',
+)
+
+
+def child(options):
+    started = time.perf_counter()
+    import django
+    django.setup()
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import get_resolver
+    get_wsgi_application()
+    get_resolver().url_patterns
+    startup = time.perf_counter() - started
+    # ru_maxrss — в килобайтах на Linux.
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    from django.test.utils import setup_databases, setup_test_environment
+    from django.test import Client
+    from recipes.fakedata import seed
+    setup_test_environment()
+    setup_databases(verbosity=0, interactive=False)
+    data = seed()
+    client = Client(HTTP_AUTHORIZATION=f'Token {data["tokens"][0]}')
+    urls = [
+        url.format(
+            ingredient=data['ingredients'][0], recipe=data['recipes'][0]
+        )
+        for url in URLS
+    ]
+    timings = {}
+    for url in urls:
+        for _ in range(options.warmup):
+            client.get(url)
+        durations = []
+        for _ in range(options.requests):
+            start = time.perf_counter()
+            response = client.get(url)
+            durations.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, response.status_code)
+        durations.sort()
+        timings[url] = {
+            'p50_ms': durations[len(durations) // 2] * 1000,
+            'p95_ms': durations[int(len(durations) * 0.95)] * 1000,
+        }
+    print(json.dumps({
+        'startup_ms': startup * 1000,
+        'memory_mb': memory,
+        'apps': len(django.apps.apps.get_app_configs()),
+        'timings': timings,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--child', choices=PROFILES)
+    options = parser.parse_args()
+    if options.child:
+        return child(options)
+
+    results = {}
+    for profile in PROFILES:
+        env = {
+            **os.environ,
+            'DJANGO_PROFILE': profile,
+            'DJANGO_SETTINGS_MODULE': 'backend.settings',
+            'DEBUG': 'True',
+            # Замеряется сам стек, без отладочных middleware.
+            'QUERY_INSPECTOR_ENABLED': 'False',
+            'THROTTLE_ENABLED': 'False',
+            'METRICS_ENABLED': 'False',
+        }
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', profile,
+             '--requests', str(options.requests),
+             '--warmup', str(options.warmup)],
+            env=env, cwd=BACKEND_DIR, check=True,
+            capture_output=True, text=True,
+        ).stdout
+        results[profile] = json.loads(output.splitlines()[-1])
+
+    print(f'{"":<32}' + ''.join(f'{profile:>12}' for profile in PROFILES))
+    for name, unit in (
+        ('startup_ms', 'мс'), ('memory_mb', 'МБ'), ('apps', '')
+    ):
+        print(f'{name + ", " + unit if unit else name:<32}' + ''.join(
+            f'{results[profile][name]:>12.1f}' for profile in PROFILES
+        ))
+    for url in results['full']['timings']:
+        for stat in ('p50_ms', 'p95_ms'):
+            print(f'{url[:24] + " " + stat:<32}' + ''.join(
+                f'{results[profile]["timings"][url][stat]:>12.2f}'
+                for profile in PROFILES
+            ))
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, str(BACKEND_DIR))
+    main()
@@ -0,0 +1,181 @@
+"""
+Фильтры списка рецептов до и после перехода на полусоединение
+и NOT EXISTS.
+
+«До» — прежние выражения RecipeFilter: JOIN с избранным и списком
+покупок (filter) и NOT IN (подзапрос) (exclude). «После» — текущий
+RecipeFilter. Для каждого сочетания параметров замеряются запросы
+страницы списка — COUNT(*) и первые PAGE_SIZE рецептов, — с --plans
+печатаются планы EXPLAIN.
+
+По умолчанию данные генерируются во временной SQLite-базе
+(generate_data); с --configured используется БД из настроек,
+например PostgreSQL с уже загруженными данными.
+
+    python benchmarks/recipe_filters.py --recipes 20000 --plans
+    DEBUG=False python benchmarks/recipe_filters.py --configured
+"""
+import argparse
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PAGE_SIZE = 6
+CASES = (
+    {'is_favorited': '1'},
+    {'is_favorited': '0'},
+    {'is_in_shopping_cart': '1'},
+    {'is_in_shopping_cart': '0'},
+    {'is_favorited': '1', 'is_in_shopping_cart': '1'},
+    {'is_favorited': '0', 'is_in_shopping_cart': '0'},
+    {'is_favorited': '1', 'author': '{authors}'},
+)
+
+
+def prepare_database(path, options):
+    env = {**os.environ, 'DEBUG': 'True', 'SQLITE_PATH': str(path)}
+    manage = [sys.executable, 'manage.py']
+    subprocess.run(
+        manage + ['migrate', '--verbosity', '0'],
+        env=env, cwd=BACKEND_DIR, check=True
+    )
+    subprocess.run(
+        manage + [
+            'generate_data', '--users', str(options.users),
+            '--recipes', str(options.recipes),
+            '--favorites', str(options.favorites),
+            '--carts', str(options.favorites),
+        ],
+        env=env, cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def legacy(recipes, user, params):
+    """
+    Прежний RecipeFilter для is_favorited и is_in_shopping_cart.
+    Несколько авторов прежний фильтр не принимал — для сравнения
+    здесь тот же IN, что и сейчас.
+    """
+    for name, related in (
+        ('is_favorited', 'favorites__user'),
+        ('is_in_shopping_cart', 'shoppingcarts__user'),
+    ):
+        if params.get(name) == '1':
+            recipes = recipes.filter(**{related: user})
+        elif params.get(name) == '0':
+            recipes = recipes.exclude(**{related: user})
+    if 'author' in params:
+        recipes = recipes.filter(author__id__in=params['author'].split(','))
+    return recipes
+
+
+def current(recipes, request, params):
+    from django.http import QueryDict
+
+    from api.filters import RecipeFilter
+
+    data = QueryDict(mutable=True)
+    data.update(params)
+    filterset = RecipeFilter(data, queryset=recipes, request=request)
+    assert filterset.is_valid(), filterset.errors
+    return filterset.qs
+
+
+def measure(queryset, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = queryset.count()
+        list(queryset.values_list('pk', flat=True)[:PAGE_SIZE])
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return count, durations[len(durations) // 2] * 1000
+
+
+def run(options):
+    import django
+    django.setup()
+    from django.db.models import Count
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from recipes.models import Favorite, Recipe, UserWithAvatar
+
+    # Пользователь с самым большим избранным — худший случай для NOT IN.
+    user_id = Favorite.objects.values('user_id').annotate(
+        total=Count('pk')
+    ).order_by('-total').values_list('user_id', flat=True).first()
+    if user_id is None:
+        sys.exit('В БД нет избранного: сначала загрузите данные.')
+    user = UserWithAvatar.objects.get(pk=user_id)
+    authors = ','.join(str(pk) for pk in Recipe.objects.values_list(
+        'author_id', flat=True
+    ).distinct()[:3])
+    request = Request(APIRequestFactory().get('/api/recipes/'))
+    request.user = user
+
+    print(
+        f'{"":<48}{"рецептов":>10}{"до, мс":>10}{"после, мс":>11}'
+        f'{"ускорение":>11}'
+    )
+    for case in CASES:
+        params = {
+            name: value.format(authors=authors)
+            for name, value in case.items()
+        }
+        recipes = Recipe.objects.all()
+        before = legacy(recipes, user, params)
+        after = current(recipes, request, params)
+        count_before, time_before = measure(before, options.repeat)
+        count_after, time_after = measure(after, options.repeat)
+        label = '&'.join(f'{name}={value}' for name, value in params.items())
+        note = '' if count_before == count_after else ' (разные count)'
+        print(
+            f'{label:<48}{count_after:>10}{time_before:>10.2f}'
+            f'{time_after:>11.2f}{time_before / time_after:>10.1f}x{note}'
+        )
+        if options.plans:
+            for title, queryset in (('до', before), ('после', after)):
+                page = queryset.order_by('-pub_date')[:PAGE_SIZE]
+                print(f'  {title}:')
+                for line in page.explain().splitlines():
+                    print(f'    {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--recipes', type=int, default=20000)
+    parser.add_argument(
+        '--favorites', type=float, default=200,
+        help='среднее число рецептов в избранном и списке покупок'
+    )
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--plans', action='store_true')
+    parser.add_argument(
+        '--configured', action='store_true',
+        help='взять БД из настроек вместо временной SQLite'
+    )
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    if options.configured:
+        return run(options)
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / 'bench.sqlite3'
+        prepare_database(database, options)
+        os.environ['DEBUG'] = 'True'
+        os.environ['SQLITE_PATH'] = str(database)
+        run(options)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, str(BACKEND_DIR))
+    main()
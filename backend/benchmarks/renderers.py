@@ -0,0 +1,107 @@
+"""
+JSONRenderer против MessagePackRenderer на страницах списка рецептов
+(RecipeListSerializer: автор и продукты вложенными объектами).
+
+Страница собирается один раз через RecipeViewSet, затем замеряется
+только кодирование ответа: время рендеринга и размер тела без сжатия
+и после gzip. Нужен пакет msgpack (pip install msgpack).
+
+    python benchmarks/renderers.py --page-sizes 10 50 200 --repeat 200
+"""
+import argparse
+import gzip
+import os
+from pathlib import Path
+import sys
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def page_data(page_size, token):
+    from rest_framework.test import APIRequestFactory
+
+    from api.pagination import UserSubscrRecipePagination
+    from api.views import RecipeViewSet
+
+    # Большие страницы — только для замера, в API предел max_page_size.
+    UserSubscrRecipePagination.max_page_size = page_size
+    request = APIRequestFactory().get(
+        '/api/recipes/', {'limit': page_size},
+        HTTP_AUTHORIZATION=f'Token {token}',
+    )
+    response = RecipeViewSet.as_view({'get': 'list'})(request)
+    assert response.status_code == 200, response.status_code
+    assert len(response.data['results']) == page_size, 'мало рецептов'
+    return response.data
+
+
+def measure(renderer, data, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = renderer.render(data)
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return {
+        'p50_ms': durations[len(durations) // 2] * 1000,
+        'bytes': len(body),
+        'gzip_bytes': len(gzip.compress(body)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--page-sizes', type=int, nargs='+', default=(6, 50, 200)
+    )
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--scale', type=int, default=10)
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    os.environ.setdefault('DEBUG', 'True')
+    os.environ['QUERY_INSPECTOR_ENABLED'] = 'False'
+    import django
+    django.setup()
+    from django.test.utils import setup_databases, setup_test_environment
+    from rest_framework.renderers import JSONRenderer
+
+    from api.renderers import MessagePackRenderer, msgpack
+    from recipes.fakedata import seed
+
+    if msgpack is None:
+        sys.exit('Нужен пакет msgpack: pip install msgpack')
+    setup_test_environment()
+    setup_databases(verbosity=0, interactive=False)
+    token = seed(scale=options.scale)['tokens'][0]
+    renderers = {
+        'json': JSONRenderer(), 'msgpack': MessagePackRenderer()
+    }
+
+    print(
+        f'{"":<18}{"p50, мс":>10}{"байт":>10}{"gzip, байт":>12}'
+        f'{"время":>8}{"размер":>8}'
+    )
+    for page_size in options.page_sizes:
+        data = page_data(page_size, token)
+        results = {
+            name: measure(renderer, data, options.repeat)
+            for name, renderer in renderers.items()
+        }
+        for name, stats in results.items():
+            json_stats = results['json']
+            print(
+                f'{f"{name} x{page_size}":<18}{stats["p50_ms"]:>10.3f}'
+                f'{stats["bytes"]:>10}{stats["gzip_bytes"]:>12}'
+                f'{stats["p50_ms"] / json_stats["p50_ms"]:>8.2f}'
+                f'{stats["bytes"] / json_stats["bytes"]:>8.2f}'
+            )
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, str(BACKEND_DIR))
+    main()
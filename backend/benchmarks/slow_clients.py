@@ -0,0 +1,261 @@
+"""
+Поведение серверов при медленных клиентах: синхронный gunicorn
+(backend.wsgi) против uvicorn (backend.asgi) с выключенным
+и включённым асинхронным путём чтения (ASYNC_READS).
+
+Медленные клиенты открывают соединение и по строке передают заголовки
+запроса в течение --seconds, быстрые в это время непрерывно
+читают горячие эндпоинты; замеряются задержки и ошибки быстрых.
+Сервер слушает напрямую, без буферизующего nginx перед ним.
+
+Нужны gunicorn и uvicorn (pip install gunicorn uvicorn); режим,
+для которого нет сервера, пропускается.
+
+    python benchmarks/slow_clients.py --workers 2 --slow 64 --fast 8
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HOST = '127.0.0.1'
+URLS = (
+    '/api/recipes/',
+    '/api/recipes/?page=2',
+    '/api/recipes/{recipe}/',
+    '/api/ingredients/?name=пр',
+    '/api/ingredients/{ingredient}/',
+)
+MODES = {
+    'wsgi': ('gunicorn', False),
+    'asgi': ('uvicorn', False),
+    'asgi+pool': ('uvicorn', True),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(path, options):
+    env = {**os.environ, 'DEBUG': 'True', 'SQLITE_PATH': str(path)}
+    manage = [sys.executable, 'manage.py']
+    subprocess.run(
+        manage + ['migrate', '--verbosity', '0'],
+        env=env, cwd=BACKEND_DIR, check=True
+    )
+    subprocess.run(
+        manage + [
+            'generate_data', '--users', str(options.users),
+            '--recipes', str(options.recipes), '--ingredients', '500',
+        ],
+        env=env, cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def server_command(server, port, options):
+    if server == 'gunicorn':
+        return [
+            'gunicorn', '--bind', f'{HOST}:{port}',
+            '--workers', str(options.workers), '--timeout', '120',
+            'backend.wsgi',
+        ]
+    return [
+        'uvicorn', '--host', HOST, '--port', str(port),
+        '--workers', str(options.workers), '--log-level', 'warning',
+        'backend.asgi:application',
+    ]
+
+
+async def get(port, path, timeout):
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(HOST, port), timeout
+    )
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+            'Connection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(data.split(b' ', 2)[1])
+
+
+async def wait_ready(port, deadline=30):
+    started = time.monotonic()
+    while time.monotonic() - started < deadline:
+        try:
+            if await get(port, '/api/ingredients/', 5) == 200:
+                return
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f'сервер на порту {port} не запустился')
+
+
+async def slow_client(port, seconds, lines):
+    """
+    Запрос, заголовки которого приходят по строке за seconds секунд.
+    """
+    try:
+        reader, writer = await asyncio.open_connection(HOST, port)
+        writer.write(b'GET /api/recipes/ HTTP/1.1\r\nHost: localhost\r\n')
+        for number in range(lines):
+            await asyncio.sleep(seconds / lines)
+            writer.write(f'X-Slow-{number}: 1\r\n'.encode())
+            await writer.drain()
+        writer.write(b'Connection: close\r\n\r\n')
+        await writer.drain()
+        await reader.read()
+        writer.close()
+    except OSError:
+        pass
+
+
+async def fast_client(port, urls, stop, timeout, results):
+    number = 0
+    while time.monotonic() < stop:
+        path = urls[number % len(urls)]
+        number += 1
+        start = time.perf_counter()
+        try:
+            status = await get(port, path, timeout)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            status = None
+        duration = time.perf_counter() - start
+        results.append((duration, status == 200))
+
+
+async def load(port, urls, options, slow):
+    results = []
+    stop = time.monotonic() + options.seconds
+    slow_tasks = [
+        asyncio.create_task(
+            slow_client(port, options.seconds, options.header_lines)
+        )
+        for _ in range(slow)
+    ]
+    # Медленные клиенты успевают занять соединения до быстрых.
+    await asyncio.sleep(0.5 if slow else 0)
+    await asyncio.gather(*(
+        fast_client(port, urls, stop, options.timeout, results)
+        for _ in range(options.fast)
+    ))
+    await asyncio.gather(*slow_tasks)
+    return results
+
+
+def summary(results, seconds):
+    durations = sorted(duration for duration, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    if not durations:
+        return {'ok': 0, 'errors': errors}
+    return {
+        'ok': len(durations),
+        'errors': errors,
+        'rps': len(durations) / seconds,
+        'p50_ms': durations[len(durations) // 2] * 1000,
+        'p95_ms': durations[int(len(durations) * 0.95)] * 1000,
+        'max_ms': durations[-1] * 1000,
+    }
+
+
+def run_mode(mode, database, urls, options):
+    server, async_reads = MODES[mode]
+    if shutil.which(server) is None:
+        print(f'{mode}: {server} не установлен, пропуск', file=sys.stderr)
+        return None
+    port = free_port()
+    env = {
+        **os.environ,
+        'DEBUG': 'True',
+        'SQLITE_PATH': str(database),
+        'DJANGO_PROFILE': 'api',
+        'ASYNC_READS_ENABLED': str(async_reads),
+        'ASYNC_READS_THREADS': str(options.threads),
+        # Замеряется сам сервер, без отладочных middleware.
+        'QUERY_INSPECTOR_ENABLED': 'False',
+        'THROTTLE_ENABLED': 'False',
+    }
+    process = subprocess.Popen(
+        server_command(server, port, options), env=env, cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        asyncio.run(wait_ready(port))
+        return {
+            phase: summary(
+                asyncio.run(load(port, urls, options, slow)), options.seconds
+            )
+            for phase, slow in (('quiet', 0), ('slow', options.slow))
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument(
+        '--slow', type=int, default=64, help='число медленных клиентов'
+    )
+    parser.add_argument(
+        '--fast', type=int, default=8, help='число быстрых клиентов'
+    )
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--header-lines', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=15)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--recipes', type=int, default=2000)
+    options = parser.parse_args()
+
+    urls = [
+        quote(url.format(recipe=1, ingredient=1), safe='/?=&')
+        for url in URLS
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / 'bench.sqlite3'
+        prepare_database(database, options)
+        results = {
+            mode: result for mode in options.modes
+            if (result := run_mode(mode, database, urls, options))
+        }
+
+    print(
+        f'{"":<18}{"ok":>8}{"errors":>8}{"rps":>8}'
+        f'{"p50, мс":>10}{"p95, мс":>10}{"max, мс":>10}'
+    )
+    for mode, phases in results.items():
+        for phase, stats in phases.items():
+            print(
+                f'{mode + " " + phase:<18}'
+                f'{stats["ok"]:>8}{stats["errors"]:>8}'
+                + ''.join(
+                    f'{stats.get(name, 0):>{width}.1f}' for name, width in (
+                        ('rps', 8), ('p50_ms', 10),
+                        ('p95_ms', 10), ('max_ms', 10),
+                    )
+                )
+            )
+
+
+if __name__ == '__main__':
+    main()
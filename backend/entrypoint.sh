@@ -2,15 +2,19 @@
 
 set -e
 
-python manage.py migrate --noinput
+# Миграции, статику и фикстуры готовит пул с полным профилем,
+# пул API (DJANGO_PROFILE=api) только запускается.
+if [ "$DJANGO_PROFILE" != "api" ]; then
+    python manage.py migrate --noinput
 
-cp -r collected_static/. /backend_static/static/
+    cp -r collected_static/. /backend_static/static/
 
-if [ "$(python manage.py shell -c "from recipes.models import Ingredient; print(Ingredient.objects.exists())")" = "False" ]; then
-    echo "Загрузка fixtures/products.json"
-    python manage.py loaddata ingredients.json
-else
-    echo "Fixtures уже загружены"
+    if [ "$(python manage.py shell -c "from recipes.models import Ingredient; print(Ingredient.objects.exists())")" = "False" ]; then
+        echo "Загрузка fixtures/products.json"
+        python manage.py loaddata ingredients.json
+    else
+        echo "Fixtures уже загружены"
+    fi
 fi
 
 exec "$@"
\ No newline at end of file
@@ -2,11 +2,13 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 
 from django.utils.safestring import mark_safe
-from django.db.models import Count
+from django.db.models import Exists, OuterRef, Prefetch
 
+from .changelist import AutocompleteFilter, CountedChangeListMixin, page_count
 from .models import (
     RecipeIngredient,
     Subscription,
+    ShortLink,
     ShoppingCart,
     Ingredient,
     Favorite,
@@ -19,14 +21,16 @@ User = get_user_model()
 
 # Список избранного и покупок
 @admin.register(Favorite, ShoppingCart)
-class FavoriteShoppingCartAdmin(admin.ModelAdmin):
+class FavoriteShoppingCartAdmin(CountedChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
     search_fields = (
         'user__username',
         'user__email',
         'recipe__name',
     )
-    list_filter = ('user',)
+    list_filter = (('user', AutocompleteFilter),)
 
 
 # Ингредиенты
@@ -43,26 +47,31 @@ class HasRecipesFilter(admin.SimpleListFilter):
         return self.LOOKUP_CHOICES
 
     def queryset(self, request, queryset):
-        queryset = queryset.annotate(
-            recipe_count=Count('recipeingredients')
+        used = Exists(
+            RecipeIngredient.objects.filter(ingredient=OuterRef('pk'))
         )
         if self.value() == 'yes':
-            return queryset.filter(recipe_count__gt=0)
+            return queryset.filter(used)
         if self.value() == 'no':
-            return queryset.filter(recipe_count=0)
+            return queryset.filter(~used)
         return queryset
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(CountedChangeListMixin, admin.ModelAdmin):
     list_display = ('name', 'measurement_unit', 'recipes_count')
     search_fields = ('name', 'measurement_unit')
     list_filter = ('measurement_unit', HasRecipesFilter,)
     ordering = ('name',)
+    page_counts = {
+        'recipes_total': (RecipeIngredient, 'ingredient'),
+    }
 
     @admin.display(description='Кол-во добавлений рецепты')
     def recipes_count(self, ingredient):
-        return ingredient.recipeingredients.count()
+        return page_count(
+            ingredient, 'recipes_total', ingredient.recipeingredients
+        )
 
 
 # Рецепты
@@ -73,10 +82,16 @@ class RecipeIngredientInline(admin.TabularInline):
     verbose_name = 'Ингредиент для рецепта'
     verbose_name_plural = 'Ингредиенты для рецепта'
     readonly_fields = ()
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient'
+        )
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(CountedChangeListMixin, admin.ModelAdmin):
     list_display_links = ('name',)
     list_display = (
         'id',
@@ -98,7 +113,9 @@ class RecipeAdmin(admin.ModelAdmin):
             'description': 'Сколько раз рецепт добавлен в избранное'
         }),
     )
-    list_filter = ('author', 'pub_date',)
+    list_filter = (('author', AutocompleteFilter), 'pub_date',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('author',)
     search_fields = (
         'name',
         'author__username',
@@ -106,6 +123,17 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     ordering = ('-pub_date',)
     inlines = [RecipeIngredientInline]
+    page_counts = {
+        'favorites_total': (Favorite, 'recipe'),
+    }
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
 
     @admin.display(description='Ингредиенты')
     @mark_safe
@@ -127,19 +155,21 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @admin.display(description='В избранном у ')
     def favorites_count(self, recipe):
-        return recipe.favorites.count()
+        return page_count(recipe, 'favorites_total', recipe.favorites)
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(CountedChangeListMixin, admin.ModelAdmin):
     list_display = (
         'recipe',
         'ingredient',
         'amount',
     )
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
     list_filter = (
-        'ingredient',
-        'recipe',
+        ('ingredient', AutocompleteFilter),
+        ('recipe', AutocompleteFilter),
     )
     search_fields = (
         'recipe__name',
@@ -149,7 +179,7 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
 
 # Пользователь
 @admin.register(User)
-class UserWithAvatarAdmin(DjangoUserAdmin):
+class UserWithAvatarAdmin(CountedChangeListMixin, DjangoUserAdmin):
     model = User
     list_display = ('id',
                     'email',
@@ -192,6 +222,11 @@ class UserWithAvatarAdmin(DjangoUserAdmin):
         }),
     )
     list_display_links = ('email',)
+    page_counts = {
+        'recipes_total': (Recipe, 'author'),
+        'subscriptions_total': (Subscription, 'user'),
+        'subscribers_total': (Subscription, 'author'),
+    }
 
     @admin.display(description='Аватар')
     @mark_safe
@@ -202,19 +237,31 @@ class UserWithAvatarAdmin(DjangoUserAdmin):
 
     @admin.display(description='Рецепты')
     def recipe_count(self, user):
-        return user.recipes.count()
+        return page_count(user, 'recipes_total', user.recipes)
 
     @admin.display(description='Подписки')
     def subscriptions_count(self, user):
-        return user.subscriptions.count()
+        return page_count(user, 'subscriptions_total', user.subscriptions)
 
     @admin.display(description='Подписчики')
     def subscribers_count(self, user):
-        return user.authors.count()
+        return page_count(user, 'subscribers_total', user.authors)
 
 
 # Подписки
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(CountedChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
     search_fields = ('user__email', 'author__email')
+
+
+# Короткие ссылки
+@admin.register(ShortLink)
+class ShortLinkAdmin(CountedChangeListMixin, admin.ModelAdmin):
+    list_display = ('code', 'recipe', 'hits')
+    list_select_related = ('recipe',)
+    autocomplete_fields = ('recipe',)
+    search_fields = ('code', 'recipe__name')
+    readonly_fields = ('code', 'hits')
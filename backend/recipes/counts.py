@@ -0,0 +1,86 @@
+"""
+Оценка числа строк вместо SELECT COUNT(*) по большим таблицам.
+
+В PostgreSQL оценку даёт планировщик (EXPLAIN по статистике таблиц),
+это доли миллисекунды при любом размере таблицы. В остальных СУБД
+большое число строк считается точно раз в CACHE_SECONDS и берётся
+из общего кэша. Выборки меньше EXACT_BELOW строк — узкие фильтры,
+списки одного пользователя — всегда считаются точно: это дёшево.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+DEFAULTS = {
+    'ENABLED': False,
+    'EXACT_BELOW': 10000,
+    'CACHE_SECONDS': 300,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'APPROXIMATE_COUNTS', {}).get(
+        name, DEFAULTS[name]
+    )
+
+
+def planner_estimate(queryset):
+    """
+    Оценка планировщика PostgreSQL для выборки или None,
+    если СУБД оценку не даёт.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cached_count(queryset, exact_below):
+    """
+    Точный COUNT(*); большой результат кэшируется по тексту запроса.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = 'count:' + hashlib.sha1(
+        f'{queryset.db}:{sql}:{params!r}'.encode()
+    ).hexdigest()
+    count = cache.get(key)
+    if count is not None:
+        return count
+    count = queryset.count()
+    if count >= exact_below:
+        cache.set(key, count, get_setting('CACHE_SECONDS'))
+    return count
+
+
+def estimated_count(queryset):
+    exact_below = get_setting('EXACT_BELOW')
+    estimate = planner_estimate(queryset)
+    if estimate is None:
+        return cached_count(queryset, exact_below)
+    if estimate < exact_below:
+        return queryset.count()
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator с оценкой числа строк: номера последних страниц
+    приблизительные, зато страница открывается без полного COUNT(*).
+    Списки (подбор по продуктам, популярные рецепты) считаются
+    как обычно.
+    """
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        return estimated_count(self.object_list)
@@ -0,0 +1,321 @@
+"""
+Синтетические данные для нагрузочных проверок.
+
+Всё пишется через bulk_create (на PostgreSQL — через COPY), в обход
+save() и сигналов, поэтому после загрузки нужно перестроить
+производные индексы и сводки (rebuild_similarity_index,
+rebuild_author_stats, refresh_popular_recipes).
+
+seed() — небольшой набор для бенчмарка. Большие объёмы генерирует
+команда generate_data: она режет работу на задачи и раздаёт их
+generate_chunk() в пуле процессов.
+"""
+from bisect import bisect
+import csv
+import io
+from itertools import accumulate
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from .models import (
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    Ingredient,
+    Favorite,
+    Recipe,
+)
+
+User = get_user_model()
+
+PASSWORD = 'bench-password'
+BATCH_SIZE = 2000
+
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена')
+LAST_NAMES = ('Иванов', 'Петрова', 'Смирнов', 'Кузнецова', 'Попов')
+DISHES = ('Суп', 'Салат', 'Пирог', 'Рагу', 'Каша', 'Запеканка', 'Паста')
+
+
+def seed(scale=1, seed=0):
+    """
+    Небольшой набор данных: 10 * scale пользователей, 30 * scale
+    рецептов и 200 продуктов. Возвращает словарь созданных id
+    и токенов пользователей.
+    """
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'bench_{seed}_{num}',
+                email=f'bench_{seed}_{num}@example.com',
+                first_name='Bench',
+                last_name=str(num),
+                password=password,
+            )
+            for num in range(10 * scale)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    users = list(User.objects.filter(
+        username__startswith=f'bench_{seed}_'
+    ).order_by('id'))
+    tokens = Token.objects.bulk_create(
+        (Token(key=Token.generate_key(), user=user) for user in users),
+        batch_size=BATCH_SIZE
+    )
+
+    Ingredient.objects.bulk_create(
+        (
+            Ingredient(name=f'продукт {seed}-{num}', measurement_unit='г')
+            for num in range(200)
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    ingredients = list(Ingredient.objects.filter(
+        name__startswith=f'продукт {seed}-'
+    ).values_list('id', flat=True))
+
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                name=f'Рецепт {num}',
+                text='Описание рецепта.',
+                cooking_time=rng.randint(5, 120),
+                image='recipe_images/placeholder.png',
+                author=rng.choice(users),
+            )
+            for num in range(30 * scale)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    recipes = list(Recipe.objects.filter(
+        author__in=users
+    ).values_list('id', flat=True))
+
+    RecipeIngredient.objects.bulk_create(
+        (
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500)
+            )
+            for recipe_id in recipes
+            for ingredient_id in rng.sample(ingredients, rng.randint(3, 10))
+        ),
+        batch_size=BATCH_SIZE
+    )
+    for model, per_user in ((Favorite, 10), (ShoppingCart, 5)):
+        model.objects.bulk_create(
+            (
+                model(user=user, recipe_id=recipe_id)
+                for user in users
+                for recipe_id in rng.sample(
+                    recipes, min(len(recipes), rng.randint(0, per_user))
+                )
+            ),
+            batch_size=BATCH_SIZE
+        )
+    Subscription.objects.bulk_create(
+        (
+            Subscription(user=user, author=author)
+            for user in users
+            for author in rng.sample(users, min(len(users), 5))
+            if author != user
+        ),
+        batch_size=BATCH_SIZE
+    )
+
+    return {
+        'users': [user.id for user in users],
+        'recipes': recipes,
+        'ingredients': ingredients,
+        'tokens': [token.key for token in tokens],
+    }
+
+
+class ZipfSampler:
+    """
+    Выборка из values с вероятностью, обратно пропорциональной
+    rank ** exponent. Порядок рангов перемешивается по seed, чтобы
+    популярными оказывались не обязательно самые старые записи,
+    но одинаково во всех процессах.
+    """
+
+    def __init__(self, values, exponent, seed):
+        self.values = list(values)
+        random.Random(seed).shuffle(self.values)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.values) + 1)
+        ))
+
+    def sample(self, rng):
+        pos = bisect(self.cum_weights, rng.random() * self.cum_weights[-1])
+        return self.values[min(pos, len(self.values) - 1)]
+
+    def sample_unique(self, rng, count, exclude=None):
+        """
+        До count различных значений. Хвост распределения почти
+        не выпадает, поэтому число попыток ограничено.
+        """
+        count = min(count, len(self.values) - (exclude is not None))
+        result = set()
+        for _ in range(count * 10):
+            if len(result) >= count:
+                break
+            value = self.sample(rng)
+            if value != exclude:
+                result.add(value)
+        return result
+
+
+def write_rows(model, objects, use_copy=False):
+    """
+    Записать объекты без save() и сигналов: COPY на PostgreSQL
+    или bulk_create на остальных СУБД.
+    """
+    if not use_copy:
+        model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        return len(objects)
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field is not model._meta.auto_field
+    ]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        # Те же преобразования, что делает bulk_create, включая
+        # auto_now_add и значения по умолчанию.
+        row = (
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for field in fields
+        )
+        writer.writerow('\\N' if value is None else value for value in row)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {quote(model._meta.db_table)} ({columns}) '
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+    return len(objects)
+
+
+_context = {}
+
+
+def init_worker(context):
+    """
+    Параметры генерации для текущего процесса. Выборки строятся
+    один раз на процесс, а не на каждую задачу.
+    """
+    _context.clear()
+    _context.update(context)
+    for name in ('users', 'recipes', 'ingredients'):
+        if context.get(name):
+            _context[f'{name}_sampler'] = ZipfSampler(
+                context[name], context['exponent'],
+                f'{context["seed"]}:{name}'
+            )
+
+
+def _count(rng, mean):
+    # Экспоненциальное распределение: у большинства пользователей
+    # немного записей, у единиц — на порядок больше среднего.
+    return int(rng.expovariate(1 / mean)) if mean else 0
+
+
+def _users(rng, numbers):
+    seed = _context['seed']
+    return User, [
+        User(
+            username=f'gen_{seed}_{num}',
+            email=f'gen_{seed}_{num}@example.com',
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            password=_context['password'],
+        )
+        for num in numbers
+    ]
+
+
+def _recipes(rng, numbers):
+    authors = _context['users_sampler']
+    return Recipe, [
+        Recipe(
+            name=f'{rng.choice(DISHES)} №{num}',
+            text='Описание рецепта.',
+            cooking_time=rng.randint(5, 180),
+            image='recipe_images/placeholder.png',
+            author_id=authors.sample(rng),
+        )
+        for num in numbers
+    ]
+
+
+def _recipe_ingredients(rng, recipe_ids):
+    ingredients = _context['ingredients_sampler']
+    return RecipeIngredient, [
+        RecipeIngredient(
+            recipe_id=recipe_id, ingredient_id=ingredient_id,
+            amount=rng.randint(1, 500)
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in ingredients.sample_unique(
+            rng, rng.randint(3, 12)
+        )
+    ]
+
+
+def _user_lists(model, mean_name):
+    def generate(rng, user_ids):
+        recipes = _context['recipes_sampler']
+        return model, [
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in recipes.sample_unique(
+                rng, _count(rng, _context[mean_name])
+            )
+        ]
+    return generate
+
+
+def _subscriptions(rng, user_ids):
+    authors = _context['users_sampler']
+    return Subscription, [
+        Subscription(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in authors.sample_unique(
+            rng, _count(rng, _context['follows']), exclude=user_id
+        )
+    ]
+
+
+PHASES = {
+    'users': _users,
+    'recipes': _recipes,
+    'recipe_ingredients': _recipe_ingredients,
+    'favorites': _user_lists(Favorite, 'favorites'),
+    'carts': _user_lists(ShoppingCart, 'carts'),
+    'subscriptions': _subscriptions,
+}
+
+
+def generate_chunk(task):
+    """
+    Сгенерировать и записать одну задачу (phase, items), где items —
+    номера новых записей или id существующих. Генератор случайных
+    чисел зависит только от seed и задачи, так что результат
+    не зависит от числа процессов.
+    """
+    phase, items = task
+    rng = random.Random(f'{_context["seed"]}:{phase}:{items[0]}')
+    model, objects = PHASES[phase](rng, items)
+    return write_rows(model, objects, _context['use_copy'])
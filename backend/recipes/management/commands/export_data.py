@@ -0,0 +1,97 @@
+import gzip
+import sys
+import tarfile
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import BATCH_SIZE, Exporter
+
+
+def open_output(path):
+    if path == '-':
+        return sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+class ImageArchive:
+    """
+    Файлы хранилища в tar по мере экспорта, каждый — один раз.
+    """
+
+    def __init__(self, path):
+        self.tar = tarfile.open(path, 'w:gz' if path.endswith('gz') else 'w')
+        self.seen = set()
+        self.missing = 0
+
+    def add(self, name):
+        if name in self.seen:
+            return
+        self.seen.add(name)
+        if not default_storage.exists(name):
+            self.missing += 1
+            return
+        info = tarfile.TarInfo(name)
+        info.size = default_storage.size(name)
+        info.mtime = default_storage.get_modified_time(name).timestamp()
+        with default_storage.open(name) as image:
+            self.tar.addfile(info, image)
+
+    def close(self):
+        self.tar.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая выгрузка продуктов, пользователей, рецептов, подписок, '
+        'избранного и списков покупок в NDJSON (см. recipes.transfer), '
+        'картинки — в отдельный tar. Загрузка — import_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл NDJSON (.gz — со сжатием), по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--images',
+            help='Архив картинок и аватаров (.tar или .tar.gz).'
+        )
+        parser.add_argument(
+            '--passwords', action='store_true',
+            help='Выгружать хеши паролей: без них пользователи '
+                 'импортируются без пароля.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        archive = None
+        if options['images']:
+            archive = ImageArchive(options['images'])
+        output = open_output(options['output'])
+        try:
+            counts = Exporter(
+                output.write,
+                add_image=archive.add if archive else None,
+                passwords=options['passwords'],
+                batch_size=options['batch_size'],
+            ).run()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+            if archive:
+                archive.close()
+
+        # Данные могут идти в stdout — отчёт пишется в stderr.
+        self.stderr.write(
+            ', '.join(f'{kind}: {count}' for kind, count in counts.items())
+            + f'. Готово за {time.perf_counter() - started:.1f} с.'
+        )
+        if archive and archive.missing:
+            self.stderr.write(
+                f'Нет в хранилище файлов: {archive.missing}.'
+            )
@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+
+from recipes import fakedata
+from recipes.models import Ingredient, Recipe
+from recipes.workers import setup
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация больших объёмов синтетических данных: пользователи, '
+        'рецепты, продукты рецептов, избранное, список покупок и '
+        'подписки. Популярность рецептов и авторов распределена '
+        'по Ципфу, результат воспроизводим по --seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Сколько продуктов досоздать к уже загруженным.'
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число рецептов в избранном пользователя.'
+        )
+        parser.add_argument(
+            '--carts', type=float, default=5,
+            help='Среднее число рецептов в списке покупок.'
+        )
+        parser.add_argument(
+            '--follows', type=float, default=10,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель распределения Ципфа.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--processes', type=int,
+            help='Число процессов. По умолчанию — число ядер, '
+                 'на SQLite — 1: запись в неё всё равно последовательна.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Записей (или пользователей, рецептов) в одной задаче.'
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Писать через bulk_create и на PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+            username__startswith=f'gen_{options["seed"]}_'
+        ).exists():
+            raise CommandError(
+                f'Данные с --seed {options["seed"]} уже загружены.'
+            )
+        processes = options['processes'] or (
+            1 if connection.vendor == 'sqlite' else os.cpu_count()
+        )
+        context = {
+            'seed': options['seed'],
+            'exponent': options['exponent'],
+            'password': make_password(fakedata.PASSWORD),
+            'use_copy': (
+                connection.vendor == 'postgresql' and not options['no_copy']
+            ),
+            'favorites': options['favorites'],
+            'carts': options['carts'],
+            'follows': options['follows'],
+        }
+        started = time.perf_counter()
+
+        last_user = User.objects.aggregate(last=Max('id'))['last'] or 0
+        self._run('users', range(options['users']), context,
+                  processes, options)
+        context['users'] = list(User.objects.filter(
+            id__gt=last_user
+        ).order_by('id').values_list('id', flat=True))
+
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f'продукт {options["seed"]}-{num}',
+                    measurement_unit='г'
+                )
+                for num in range(options['ingredients'])
+            ),
+            batch_size=fakedata.BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        context['ingredients'] = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+
+        last_recipe = Recipe.objects.aggregate(last=Max('id'))['last'] or 0
+        self._run('recipes', range(options['recipes']), context,
+                  processes, options)
+        context['recipes'] = list(Recipe.objects.filter(
+            id__gt=last_recipe
+        ).order_by('id').values_list('id', flat=True))
+
+        self._run('recipe_ingredients', context['recipes'], context,
+                  processes, options)
+        for phase in ('favorites', 'carts', 'subscriptions'):
+            self._run(phase, context['users'], context, processes, options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с. Перестройте '
+            'производные данные: rebuild_similarity_index, '
+            'rebuild_author_stats, refresh_popular_recipes.'
+        ))
+
+    def _run(self, phase, items, context, processes, options):
+        size = options['chunk_size']
+        tasks = [
+            (phase, items[start:start + size])
+            for start in range(0, len(items), size)
+        ]
+        started = time.perf_counter()
+        rows = 0
+
+        def report(done):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{phase}: задач {done}/{len(tasks)}, строк {rows}, '
+                f'{rows / elapsed if elapsed else 0:.0f} строк/с'
+            )
+
+        if processes == 1:
+            fakedata.init_worker(context)
+            for done, task in enumerate(tasks, 1):
+                rows += fakedata.generate_chunk(task)
+                report(done)
+            return
+        # spawn: дочерние процессы настраивают Django сами и открывают
+        # собственные соединения с БД.
+        with ProcessPoolExecutor(
+            processes, mp_context=get_context('spawn'),
+            initializer=setup,
+            initargs=('recipes.fakedata.init_worker', context),
+        ) as pool:
+            futures = [
+                pool.submit(fakedata.generate_chunk, task) for task in tasks
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                rows += future.result()
+                report(done)
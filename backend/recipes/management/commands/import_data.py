@@ -0,0 +1,128 @@
+import gzip
+import json
+from pathlib import Path
+import sys
+import tarfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import BATCH_SIZE, Importer, restore_images
+
+
+def open_input(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def read_checkpoint(path):
+    """
+    (последняя загруженная строка, {id рецепта в файле: id в БД}).
+    """
+    line, recipe_ids = 0, {}
+    if not path.exists():
+        return line, recipe_ids
+    with path.open(encoding='utf-8') as checkpoint:
+        for entry in checkpoint:
+            try:
+                entry = json.loads(entry)
+            except ValueError:
+                # Недописанная запись: её пачка будет повторена.
+                continue
+            line = entry['line']
+            recipe_ids.update(entry['recipes'])
+    return line, recipe_ids
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая загрузка NDJSON из export_data: пачки по --batch-size '
+        'записей через bulk_create. С --checkpoint прерванную загрузку '
+        'можно продолжить тем же вызовом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', help='Файл NDJSON (.gz — со сжатием) или - для stdin.'
+        )
+        parser.add_argument(
+            '--images',
+            help='Архив картинок из export_data; уже существующие файлы '
+                 'не перезаписываются.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл прогресса: дописывается после каждой пачки, '
+                 'при повторном запуске загрузка продолжается с него.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            source = open_input(options['input'])
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть данные: {error}')
+        if options['images']:
+            try:
+                with tarfile.open(options['images'], 'r|*') as tar:
+                    saved, skipped = restore_images(tar)
+            except (OSError, tarfile.TarError) as error:
+                if source is not sys.stdin:
+                    source.close()
+                raise CommandError(f'Не удалось прочитать картинки: {error}')
+            self.stdout.write(
+                f'Картинки: сохранено {saved}, пропущено {skipped}.'
+            )
+
+        start_line, recipe_ids = 0, {}
+        checkpoint = None
+        if options['checkpoint']:
+            path = Path(options['checkpoint'])
+            start_line, recipe_ids = read_checkpoint(path)
+            if start_line:
+                self.stdout.write(f'Продолжение со строки {start_line + 1}.')
+            checkpoint = path.open('a', encoding='utf-8')
+
+        def on_batch(line, new_recipes):
+            if checkpoint is not None:
+                checkpoint.write(
+                    json.dumps({'line': line, 'recipes': new_recipes}) + '\n'
+                )
+                checkpoint.flush()
+            self.stdout.write(f'Загружено строк: {line}')
+
+        importer = Importer(
+            recipe_ids, on_batch=on_batch, batch_size=options['batch_size']
+        )
+        try:
+            counts, skipped = importer.run(source, start_line)
+        except (ValueError, KeyError) as error:
+            raise CommandError(f'Ошибка в данных: {error!r}')
+        except OSError as error:
+            raise CommandError(f'Ошибка чтения данных: {error}')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if checkpoint is not None:
+                checkpoint.close()
+
+        self.stdout.write(
+            'Записано: '
+            + ', '.join(f'{kind} {count}' for kind, count in counts.items())
+        )
+        if skipped:
+            self.stdout.write(
+                'Пропущено (уже есть или нет ссылки): '
+                + ', '.join(
+                    f'{kind} {count}' for kind, count in skipped.items()
+                )
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с. Перестройте '
+            'производные данные: rebuild_similarity_index, '
+            'rebuild_author_stats, refresh_popular_recipes.'
+        ))
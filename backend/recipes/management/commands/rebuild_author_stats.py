@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from recipes.models import (
+    AuthorIngredientStats,
+    AuthorDailyStats,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    Favorite,
+    Recipe,
+)
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает статистику авторов с нуля. Нужна один раз '
+        'для уже существующих данных и после массовой загрузки '
+        'в обход API.'
+    )
+
+    def handle(self, *args, **options):
+        daily = defaultdict(lambda: defaultdict(int))
+        sources = (
+            ('recipes', Recipe.objects.values(
+                owner=F('author_id'), day=TruncDate('pub_date'))),
+            ('favorites', Favorite.objects.values(
+                owner=F('recipe__author_id'), day=TruncDate('added_at'))),
+            ('carts', ShoppingCart.objects.values(
+                owner=F('recipe__author_id'), day=TruncDate('added_at'))),
+        )
+        for field, rows in sources:
+            for row in rows.annotate(total=Count('id')).order_by():
+                daily[row['owner'], row['day']][field] += row['total']
+
+        # У подписок нет даты: всех текущих подписчиков относим на сегодня.
+        today = timezone.localdate()
+        for row in Subscription.objects.values('author_id').annotate(
+            total=Count('id')
+        ).order_by():
+            daily[row['author_id'], today]['followers'] += row['total']
+
+        ingredients = RecipeIngredient.objects.values(
+            owner=F('recipe__author_id'), product=F('ingredient_id')
+        ).annotate(total=Count('id')).order_by()
+
+        with transaction.atomic():
+            AuthorDailyStats.objects.all().delete()
+            AuthorIngredientStats.objects.all().delete()
+            AuthorDailyStats.objects.bulk_create(
+                (
+                    AuthorDailyStats(author_id=author, day=day, **values)
+                    for (author, day), values in daily.items()
+                ),
+                batch_size=BATCH_SIZE
+            )
+            AuthorIngredientStats.objects.bulk_create(
+                (
+                    AuthorIngredientStats(
+                        author_id=row['owner'],
+                        ingredient_id=row['product'],
+                        recipes=row['total'],
+                    )
+                    for row in ingredients.iterator()
+                ),
+                batch_size=BATCH_SIZE
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика пересчитана: {len(daily)} строк по дням.'
+        ))
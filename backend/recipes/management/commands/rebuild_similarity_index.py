@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from multiprocessing import get_context
+from operator import itemgetter
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.minhash import compute_chunk
+from recipes.models import RecipeBucket, RecipeIngredient, RecipeSignature
+
+
+class Command(BaseCommand):
+    help = 'Полная перестройка MinHash LSH-индекса похожих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Число процессов для расчёта сигнатур.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Рецептов в одной задаче пула.'
+        )
+
+    def _chunks(self, chunk_size):
+        rows = RecipeIngredient.objects.order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator(chunk_size=10000)
+        chunk = []
+        for recipe_id, group in groupby(rows, key=itemgetter(0)):
+            chunk.append((recipe_id, [pk for _, pk in group]))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def handle(self, *args, **options):
+        total = 0
+        with transaction.atomic():
+            RecipeBucket.objects.all().delete()
+            RecipeSignature.objects.all().delete()
+            # spawn, а не fork: дочерним процессам не нужны ни Django,
+            # ни унаследованное открытое соединение с БД.
+            with ProcessPoolExecutor(
+                options['processes'], mp_context=get_context('spawn')
+            ) as pool:
+                results = pool.map(
+                    compute_chunk, self._chunks(options['chunk_size'])
+                )
+                for chunk in results:
+                    RecipeSignature.objects.bulk_create(
+                        RecipeSignature(recipe_id=recipe_id, minhash=sig)
+                        for recipe_id, sig, _ in chunk
+                    )
+                    RecipeBucket.objects.bulk_create(
+                        RecipeBucket(
+                            recipe_id=recipe_id, band=band, bucket=bucket
+                        )
+                        for recipe_id, _, buckets in chunk
+                        for band, bucket in enumerate(buckets)
+                    )
+                    total += len(chunk)
+                    self.stdout.write(f'Обработано рецептов: {total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс похожих рецептов перестроен: {total} рецептов.'
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.popularity import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        'Инкрементально обновляет суточные сводки популярности рецептов. '
+        'Запускается по cron или в режиме --interval.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Повторять каждые N секунд вместо однократного запуска.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            added = refresh()
+            self.stdout.write(f'Учтено новых добавлений: {added}')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.3 on 2026-10-19 07:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorIngredientStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipes', models.PositiveIntegerField(default=0, verbose_name='Рецептов с продуктом')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_stats', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_stats', to='recipes.ingredient', verbose_name='Продукт')),
+            ],
+            options={
+                'verbose_name': 'продукт автора',
+                'verbose_name_plural': 'Продукты авторов',
+            },
+        ),
+        migrations.CreateModel(
+            name='AuthorDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('recipes', models.IntegerField(default=0, verbose_name='Рецепты')),
+                ('favorites', models.IntegerField(default=0, verbose_name='В избранном')),
+                ('carts', models.IntegerField(default=0, verbose_name='В списках покупок')),
+                ('followers', models.IntegerField(default=0, verbose_name='Подписчики')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'статистика автора за день',
+                'verbose_name_plural': 'Статистика авторов',
+                'ordering': ('day',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='authoringredientstats',
+            index=models.Index(fields=['author', '-recipes'], name='authoringredient_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='authoringredientstats',
+            constraint=models.UniqueConstraint(fields=('author', 'ingredient'), name='unique_author_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='authordailystats',
+            constraint=models.UniqueConstraint(fields=('author', 'day'), name='unique_author_day'),
+        ),
+    ]
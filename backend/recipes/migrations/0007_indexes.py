@@ -0,0 +1,45 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:10
+
+from django.db import migrations, models
+
+# Поиск продуктов ?name= (istartswith) на PostgreSQL выполняется как
+# UPPER(name::text) LIKE 'X%'. Обычный индекс по name для него
+# не подходит: нужен индекс по выражению с text_pattern_ops, который
+# в Django 3.2 не описать в Meta.indexes.
+INGREDIENT_NAME_INDEX = 'recipes_ingredient_name_upper_like_idx'
+
+
+def create_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX} '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+
+
+def drop_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_author_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            create_ingredient_name_index, drop_ingredient_name_index
+        ),
+    ]
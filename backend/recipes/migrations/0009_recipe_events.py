@@ -0,0 +1,27 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_short_links'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channels', models.TextField(verbose_name='Каналы (JSON)')),
+                ('event', models.CharField(max_length=32, verbose_name='Тип события')),
+                ('data', models.TextField(verbose_name='Данные (JSON)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'событие о рецепте',
+                'verbose_name_plural': 'События о рецептах',
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+"""
+MinHash-сигнатуры наборов ингредиентов и LSH-разбиение на полосы.
+
+Вероятность совпадения одной позиции сигнатур двух наборов равна
+коэффициенту Жаккара этих наборов. Сигнатура режется на BANDS полос
+по ROWS значений; рецепты, у которых совпала хотя бы одна полоса,
+становятся кандидатами в похожие. При BANDS=16, ROWS=4 порог, выше
+которого пара почти наверняка попадает в кандидаты, около 0.5.
+
+Модуль не зависит от Django, чтобы его можно было использовать
+в дочерних процессах пула без настройки приложения.
+"""
+from array import array
+from hashlib import blake2b
+import random
+
+BANDS = 16
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+
+# Простое число Мерсенна 2^61 - 1.
+PRIME = (1 << 61) - 1
+MAX_HASH = PRIME
+
+_rng = random.Random(20250603)
+PERMUTATIONS = tuple(
+    (_rng.randrange(1, PRIME), _rng.randrange(0, PRIME))
+    for _ in range(NUM_PERM)
+)
+
+
+def signature(ingredient_ids):
+    """
+    MinHash-сигнатура набора id в виде массива из NUM_PERM чисел.
+    """
+    ids = set(ingredient_ids)
+    if not ids:
+        return array('Q', [MAX_HASH] * NUM_PERM)
+    return array('Q', (
+        min((a * pk + b) % PRIME for pk in ids)
+        for a, b in PERMUTATIONS
+    ))
+
+
+def band_hashes(sig):
+    """
+    Хэш каждой полосы сигнатуры, приведённый к знаковому 64-битному
+    числу, чтобы помещаться в BigIntegerField.
+    """
+    return [
+        int.from_bytes(
+            blake2b(
+                sig[band * ROWS:(band + 1) * ROWS].tobytes(),
+                digest_size=8,
+                person=band.to_bytes(2, 'big'),
+            ).digest(),
+            'big',
+            signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def jaccard(first, second):
+    first, second = set(first), set(second)
+    if not first and not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def compute_chunk(chunk):
+    """
+    Сигнатуры и хэши полос для пачки [(recipe_id, ingredient_ids), ...].
+    Выполняется в процессах пула при полной перестройке индекса.
+    """
+    result = []
+    for recipe_id, ingredient_ids in chunk:
+        sig = signature(ingredient_ids)
+        result.append((recipe_id, sig.tobytes(), band_hashes(sig)))
+    return result
@@ -100,6 +100,11 @@ class AbstractUserRecipeList(models.Model):
         verbose_name='Рецепт',
         on_delete=models.CASCADE,
     )
+    added_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         abstract = True
@@ -203,6 +208,16 @@ class Recipe(models.Model):
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        # Лента рецептов и рецепты автора (фильтр ?author=, рецепты
+        # в подписках) читаются по убыванию даты: индекс отдаёт первую
+        # страницу без сортировки всей таблицы (см. index_advisor).
+        indexes = [
+            models.Index(fields=('-pub_date',), name='recipe_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -243,3 +258,281 @@ class RecipeIngredient(models.Model):
     def __str__(self):
         return (f'{self.recipe.name} содержит {self.ingredient.name} '
                 f'в количестве {self.amount} {self.ingredient.measurement_unit}')
+
+
+# Похожие рецепты
+class RecipeSignature(models.Model):
+    """
+    MinHash-сигнатура набора ингредиентов рецепта.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature'
+    )
+    minhash = models.BinaryField(
+        verbose_name='Сигнатура',
+    )
+
+    class Meta:
+        verbose_name = 'сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+    def __str__(self):
+        return f'Сигнатура рецепта {self.recipe_id}'
+
+
+class RecipeBucket(models.Model):
+    """
+    LSH-корзина: хэш одной полосы сигнатуры рецепта.
+    Рецепты с общей корзиной — кандидаты в похожие.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='buckets'
+    )
+    band = models.PositiveSmallIntegerField(
+        verbose_name='Номер полосы',
+    )
+    bucket = models.BigIntegerField(
+        verbose_name='Хэш полосы',
+    )
+
+    class Meta:
+        verbose_name = 'LSH-корзина'
+        verbose_name_plural = 'LSH-корзины'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'band'),
+                name='unique_recipe_band'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('band', 'bucket'),
+                name='recipebucket_band_bucket_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id}: полоса {self.band}'
+
+
+# Популярные рецепты
+class RecipeDailyActivity(models.Model):
+    """
+    Суточная сводка: сколько раз рецепт добавили в избранное
+    и в список покупок за день. Пополняется командой
+    refresh_popular_recipes.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='daily_activity'
+    )
+    day = models.DateField(
+        verbose_name='День',
+    )
+    favorites = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0,
+    )
+    carts = models.PositiveIntegerField(
+        verbose_name='Добавлений в список покупок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'активность по рецепту за день'
+        verbose_name_plural = 'Активность по рецептам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'day'),
+                name='unique_recipe_day'
+            )
+        ]
+        indexes = [
+            models.Index(fields=('day',), name='recipedailyactivity_day_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} за {self.day}'
+
+
+class RollupState(models.Model):
+    """
+    Отметка, до какой записи источник уже учтён в сводках.
+    """
+    name = models.CharField(
+        verbose_name='Источник',
+        max_length=64,
+        unique=True,
+    )
+    last_id = models.BigIntegerField(
+        verbose_name='Последний учтённый id',
+        default=0,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Обновлено',
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = 'состояние сводки'
+        verbose_name_plural = 'Состояния сводок'
+
+    def __str__(self):
+        return f'{self.name}: {self.last_id}'
+
+
+# Статистика авторов
+class AuthorDailyStats(models.Model):
+    """
+    Изменения показателей автора за день: рецепты, добавления
+    его рецептов в избранное и список покупок, подписчики.
+    Значения — приращения, итог получается суммой по дням.
+    """
+    author = models.ForeignKey(
+        UserWithAvatar,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+    day = models.DateField(
+        verbose_name='День',
+    )
+    recipes = models.IntegerField(
+        verbose_name='Рецепты',
+        default=0,
+    )
+    favorites = models.IntegerField(
+        verbose_name='В избранном',
+        default=0,
+    )
+    carts = models.IntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+    )
+    followers = models.IntegerField(
+        verbose_name='Подписчики',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'статистика автора за день'
+        verbose_name_plural = 'Статистика авторов'
+        ordering = ('day',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('author', 'day'),
+                name='unique_author_day'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.author_id} за {self.day}'
+
+
+class AuthorIngredientStats(models.Model):
+    """
+    В скольких рецептах автора используется продукт.
+    """
+    author = models.ForeignKey(
+        UserWithAvatar,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='ingredient_stats'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Продукт',
+        on_delete=models.CASCADE,
+        related_name='author_stats'
+    )
+    recipes = models.PositiveIntegerField(
+        verbose_name='Рецептов с продуктом',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'продукт автора'
+        verbose_name_plural = 'Продукты авторов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('author', 'ingredient'),
+                name='unique_author_ingredient'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('author', '-recipes'),
+                name='authoringredient_top_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.author_id}: {self.ingredient_id} × {self.recipes}'
+
+
+class ShortLink(models.Model):
+    """
+    Короткая ссылка на рецепт: /s/<code>/. Код выводится из id
+    рецепта (recipes.shortlinks.encode) и не меняется.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='short_link'
+    )
+    code = models.CharField(
+        verbose_name='Код',
+        max_length=12,
+        unique=True,
+    )
+    hits = models.PositiveBigIntegerField(
+        verbose_name='Переходов',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'короткая ссылка'
+        verbose_name_plural = 'Короткие ссылки'
+
+    def __str__(self):
+        return self.code
+
+
+class RecipeEvent(models.Model):
+    """
+    Событие потока о новых рецептах (api.events.DatabaseBroker):
+    через эту таблицу события из воркеров WSGI доходят до процессов
+    ASGI, которые держат соединения Server-Sent Events.
+    """
+    channels = models.TextField(
+        verbose_name='Каналы (JSON)',
+    )
+    event = models.CharField(
+        verbose_name='Тип события',
+        max_length=32,
+    )
+    data = models.TextField(
+        verbose_name='Данные (JSON)',
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Создано',
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'событие о рецепте'
+        verbose_name_plural = 'События о рецептах'
+
+    def __str__(self):
+        return f'{self.id}: {self.event}'
@@ -0,0 +1,170 @@
+"""
+Популярные рецепты: суточные сводки добавлений в избранное
+и список покупок и рейтинги по окнам времени.
+
+Сводки пополняются инкрементально, пачками по CHUNK_SIZE строк —
+учитываются только записи с id больше запомненного в RollupState
+и старше SETTLE_SECONDS. Рейтинг окна кэшируется до следующего
+обновления: ключ кэша содержит номер обновления, поэтому после
+refresh() все процессы сами перейдут на новый ключ.
+"""
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Favorite, RecipeDailyActivity, RollupState, ShoppingCart
+
+# Окно — сколько предыдущих дней учитывать помимо текущего.
+WINDOWS = {
+    'day': 1,
+    'week': 7,
+    'all': None,
+}
+
+SOURCES = (
+    ('favorites', Favorite),
+    ('carts', ShoppingCart),
+)
+
+STATE_NAME = 'popular-recipes'
+
+RANKING_LIMIT = getattr(settings, 'POPULAR_RECIPES_LIMIT', 100)
+# Сколько секунд запись считается возможно ещё не закоммиченной.
+SETTLE_SECONDS = getattr(settings, 'POPULAR_RECIPES_SETTLE_SECONDS', 60)
+# Строк сводки в одной пачке обновления.
+CHUNK_SIZE = 500
+
+
+def _add_counts(field, rows):
+    # Диапазон дней вместо day__in: параметров запроса не больше,
+    # чем рецептов в пачке.
+    days = [row['day'] for row in rows]
+    existing = {
+        (activity.recipe_id, activity.day): activity
+        for activity in RecipeDailyActivity.objects.filter(
+            recipe_id__in={row['recipe_id'] for row in rows},
+            day__range=(min(days), max(days)),
+        )
+    }
+    created, updated = [], []
+    for row in rows:
+        activity = existing.get((row['recipe_id'], row['day']))
+        if activity is None:
+            created.append(RecipeDailyActivity(
+                recipe_id=row['recipe_id'],
+                day=row['day'],
+                **{field: row['total']}
+            ))
+        else:
+            setattr(activity, field, getattr(activity, field) + row['total'])
+            updated.append(activity)
+    RecipeDailyActivity.objects.bulk_update(
+        updated, [field], batch_size=CHUNK_SIZE
+    )
+    RecipeDailyActivity.objects.bulk_create(created, batch_size=CHUNK_SIZE)
+
+
+def _settled_bound(model, last_id):
+    """
+    Последний id, до которого все записи источника уже видны.
+
+    id выдаётся при вставке, а видна запись после коммита, поэтому
+    запись с меньшим id может появиться позже записи с большим.
+    Записи моложе SETTLE_SECONDS не учитываются, как и всё после
+    первой такой записи: их учтёт следующее обновление.
+    """
+    new = model.objects.filter(id__gt=last_id)
+    unsettled = new.filter(
+        added_at__gt=timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    ).aggregate(first=Min('id'))['first']
+    if unsettled is not None:
+        return unsettled - 1
+    return new.aggregate(last=Max('id'))['last'] or last_id
+
+
+def _add_source(field, model, last_id, bound):
+    """
+    Учесть записи источника с id в (last_id, bound]. Сводка по дням
+    читается потоком и пишется пачками по CHUNK_SIZE строк;
+    в порядке (рецепт, день) каждая её строка попадает ровно
+    в одну пачку. Возвращает число учтённых записей.
+    """
+    rows = model.objects.filter(
+        id__gt=last_id, id__lte=bound
+    ).annotate(
+        day=TruncDate('added_at')
+    ).values('recipe_id', 'day').annotate(
+        total=Count('id')
+    ).order_by('recipe_id', 'day').iterator(CHUNK_SIZE)
+    added = 0
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return added
+        _add_counts(field, chunk)
+        added += sum(row['total'] for row in chunk)
+
+
+def refresh():
+    """
+    Учесть в сводках новые добавления. Возвращает их количество.
+    """
+    added = 0
+    with transaction.atomic():
+        for field, model in SOURCES:
+            state, _ = RollupState.objects.select_for_update().get_or_create(
+                name=f'{STATE_NAME}:{field}'
+            )
+            bound = _settled_bound(model, state.last_id)
+            if bound <= state.last_id:
+                continue
+            added += _add_source(field, model, state.last_id, bound)
+            state.last_id = bound
+            state.save()
+
+        # Номер обновления — часть ключа кэша рейтингов.
+        state, _ = RollupState.objects.select_for_update().get_or_create(
+            name=STATE_NAME
+        )
+        state.last_id = F('last_id') + 1
+        state.save()
+    return added
+
+
+def _rank(window):
+    activity = RecipeDailyActivity.objects.all()
+    days = WINDOWS[window]
+    if days is not None:
+        activity = activity.filter(
+            day__gte=timezone.localdate() - timedelta(days=days)
+        )
+    return [
+        (row['recipe_id'], row['favorites'], row['carts'])
+        for row in activity.values('recipe_id').annotate(
+            favorites=Sum('favorites'),
+            carts=Sum('carts'),
+        ).annotate(
+            score=F('favorites') + F('carts')
+        ).order_by('-score', '-recipe_id')[:RANKING_LIMIT]
+    ]
+
+
+def popular_recipes(window):
+    """
+    Рейтинг окна: список (recipe_id, favorites, carts), лучшие — первыми.
+    """
+    generation = RollupState.objects.filter(
+        name=STATE_NAME
+    ).values_list('last_id', flat=True).first() or 0
+    key = f'{STATE_NAME}:{window}:{generation}'
+    ranking = cache.get(key)
+    if ranking is None:
+        ranking = _rank(window)
+        cache.set(key, ranking, timeout=24 * 60 * 60)
+    return ranking
@@ -0,0 +1,139 @@
+"""
+Серверная страница рецепта для коротких ссылок.
+
+Краулеры и превью мессенджеров не выполняют JS, поэтому вместо
+перехода в SPA получают готовый HTML с разметкой OpenGraph: название,
+описание, продукты и картинку под размер превью (IMAGE_SIZE).
+С FOR_ALL страницу получают и люди — как быстрый первый экран со
+ссылкой в приложение.
+
+Данные страницы кэшируются по рецепту на CACHE_SECONDS
+и сбрасываются при сохранении и удалении рецепта и его продуктов.
+"""
+import hashlib
+from io import BytesIO
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from django.utils.text import Truncator
+from PIL import Image, ImageOps
+
+from .models import Recipe, RecipeIngredient
+
+DEFAULTS = {
+    'BOT_USER_AGENTS': (
+        r'bot|crawler|spider|facebookexternalhit|vkShare|WhatsApp|Viber'
+        r'|Slack|Discord|SkypeUriPreview|Pinterest|Embedly|preview'
+    ),
+    'FOR_ALL': False,
+    'CACHE_SECONDS': 24 * 60 * 60,
+    'IMAGE_SIZE': (1200, 630),
+    'DESCRIPTION_LENGTH': 200,
+}
+
+_bot_patterns = {}
+
+
+def get_setting(name):
+    return getattr(settings, 'SHARE_PAGES', {}).get(name, DEFAULTS[name])
+
+
+def wants_share_page(request):
+    if get_setting('FOR_ALL'):
+        return True
+    pattern = get_setting('BOT_USER_AGENTS')
+    if pattern not in _bot_patterns:
+        _bot_patterns[pattern] = re.compile(pattern, re.IGNORECASE)
+    return bool(_bot_patterns[pattern].search(
+        request.META.get('HTTP_USER_AGENT', '')
+    ))
+
+
+def cache_key(recipe_id):
+    return f'share-page:{recipe_id}'
+
+
+def invalidate(recipe_id):
+    cache.delete(cache_key(recipe_id))
+
+
+def preview_image(recipe):
+    """
+    (URL, размер) картинки рецепта, обрезанной под IMAGE_SIZE. Файл
+    создаётся один раз на версию картинки; при ошибке — исходная
+    картинка без размера.
+    """
+    if not recipe.image:
+        return None, None
+    width, height = get_setting('IMAGE_SIZE')
+    digest = hashlib.sha1(recipe.image.name.encode()).hexdigest()[:12]
+    name = f'recipe_images/share/{recipe.pk}-{digest}-{width}x{height}.jpg'
+    try:
+        if not default_storage.exists(name):
+            with recipe.image.open('rb') as source:
+                image = ImageOps.fit(
+                    Image.open(source).convert('RGB'), (width, height),
+                    Image.LANCZOS
+                )
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=85, optimize=True)
+            name = default_storage.save(name, ContentFile(output.getvalue()))
+        return default_storage.url(name), (width, height)
+    except (OSError, ValueError):
+        return recipe.image.url, None
+
+
+def page_data(recipe_id):
+    data = cache.get(cache_key(recipe_id))
+    if data is not None:
+        return data
+    recipe = Recipe.objects.select_related('author').prefetch_related(
+        Prefetch(
+            'recipeingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        )
+    ).filter(pk=recipe_id).first()
+    if recipe is None:
+        return None
+    image, image_size = preview_image(recipe)
+    data = {
+        'id': recipe.pk,
+        'name': recipe.name,
+        'text': recipe.text,
+        'description': Truncator(' '.join(recipe.text.split())).chars(
+            get_setting('DESCRIPTION_LENGTH')
+        ),
+        'author': recipe.author.get_full_name() or recipe.author.username,
+        'cooking_time': recipe.cooking_time,
+        'image': image,
+        'image_size': image_size,
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'amount': item.amount,
+                'unit': item.ingredient.measurement_unit,
+            }
+            for item in recipe.recipeingredients.all()
+        ],
+    }
+    cache.set(cache_key(recipe_id), data, get_setting('CACHE_SECONDS'))
+    return data
+
+
+def render_share_page(request, recipe_id):
+    """
+    HTML страницы рецепта или None, если рецепта нет.
+    """
+    data = page_data(recipe_id)
+    if data is None:
+        return None
+    return render_to_string('recipes/share.html', {
+        **data,
+        'url': request.build_absolute_uri(f'/recipes/{recipe_id}/'),
+        'image': data['image'] and request.build_absolute_uri(data['image']),
+    })
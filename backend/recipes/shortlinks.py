@@ -0,0 +1,208 @@
+"""
+Короткие ссылки на рецепты.
+
+Код — base62 от id рецепта, перемешанного умножением по модулю
+62 ** CODE_LENGTH: коды не идут подряд, но у рецепта код всегда один.
+Разрешение код → рецепт кэшируется в LRU процесса, так что всплеск
+переходов по популярной ссылке не обращается к БД; неизвестные коды
+запоминаются на MISS_TTL секунд, и перебор кодов тоже не доходит
+до БД. После удаления ссылки или рецепта (recipes.signals)
+увеличивается номер поколения в общем кэше, остальные процессы
+не позже чем через секунду видят новый номер и очищают свои LRU.
+Переходы копятся в памяти и записываются пачкой раз
+в FLUSH_INTERVAL секунд или каждые FLUSH_HITS переходов.
+"""
+import atexit
+from collections import Counter, OrderedDict
+import string
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Recipe, ShortLink
+
+DEFAULTS = {
+    'CACHE_SIZE': 10000,
+    'FLUSH_INTERVAL': 10,
+    'FLUSH_HITS': 1000,
+    'MISS_TTL': 60,
+}
+
+GENERATION_KEY = 'short-links:generation'
+# Как часто процесс сверяет номер поколения, в секундах.
+GENERATION_CHECK_INTERVAL = 1
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_LENGTH = 6
+SPACE = len(ALPHABET) ** CODE_LENGTH
+# Нечётный и не кратный 31 множитель — взаимно прост с 62 ** n,
+# поэтому умножение по модулю SPACE — перестановка.
+MULTIPLIER = 1580030173
+
+
+def get_setting(name):
+    return getattr(settings, 'SHORT_LINKS', {}).get(name, DEFAULTS[name])
+
+
+def encode(recipe_id):
+    number = recipe_id * MULTIPLIER % SPACE
+    code = []
+    for _ in range(CODE_LENGTH):
+        number, digit = divmod(number, len(ALPHABET))
+        code.append(ALPHABET[digit])
+    return ''.join(reversed(code))
+
+
+def get_or_create_link(recipe_id):
+    link, _ = ShortLink.objects.get_or_create(
+        recipe_id=recipe_id, defaults={'code': encode(recipe_id)}
+    )
+    return link
+
+
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class HitBuffer:
+    """
+    Счётчик переходов процесса: {id ссылки: число переходов}.
+    """
+
+    def __init__(self):
+        self._hits = Counter()
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def add(self, link_id):
+        with self._lock:
+            self._hits[link_id] += 1
+            due = (
+                sum(self._hits.values()) >= get_setting('FLUSH_HITS')
+                or time.monotonic() - self._flushed_at
+                >= get_setting('FLUSH_INTERVAL')
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+            self._flushed_at = time.monotonic()
+        if not hits:
+            return
+        with transaction.atomic():
+            for link_id, count in sorted(hits.items()):
+                ShortLink.objects.filter(pk=link_id).update(
+                    hits=F('hits') + count
+                )
+
+
+class Generation:
+    """
+    Номер поколения кэшей коротких ссылок в общем кэше.
+    """
+
+    def __init__(self):
+        self._seen = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _current():
+        cache.add(GENERATION_KEY, 0, timeout=None)
+        return cache.get(GENERATION_KEY, 0)
+
+    def check(self):
+        """
+        Очистить LRU процесса, если поколение сменилось.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < GENERATION_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        current = self._current()
+        if current != self._seen:
+            links.clear()
+            misses.clear()
+            self._seen = current
+
+    def bump(self):
+        cache.add(GENERATION_KEY, 0, timeout=None)
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            # Ключ вытеснен между add и incr: номер по времени
+            # отличается от запомненного в процессах.
+            cache.set(
+                GENERATION_KEY, int(time.time() * 1000), timeout=None
+            )
+        links.clear()
+        misses.clear()
+        self._checked_at = 0.0
+
+
+# {код: (id ссылки, id рецепта)}
+links = LRUCache(get_setting('CACHE_SIZE'))
+# {неизвестный код: до какого момента time.monotonic() он неизвестен}
+misses = LRUCache(get_setting('CACHE_SIZE'))
+generation = Generation()
+hits = HitBuffer()
+atexit.register(hits.flush)
+
+
+def invalidate():
+    """
+    Сбросить кэши кодов во всех процессах после удаления ссылок.
+    """
+    generation.bump()
+
+
+def resolve(code):
+    """
+    (id ссылки, id рецепта) по коду или None.
+    """
+    generation.check()
+    link = links.get(code)
+    if link is not None:
+        return link
+    expires = misses.get(code)
+    if expires is not None and expires > time.monotonic():
+        return None
+    link = ShortLink.objects.filter(code=code).values_list(
+        'pk', 'recipe_id'
+    ).first()
+    if link is None and code.isdigit():
+        # Старые ссылки вида /s/<id рецепта>/.
+        recipe_id = int(code)
+        if Recipe.objects.filter(pk=recipe_id).exists():
+            link = (get_or_create_link(recipe_id).pk, recipe_id)
+    if link is None:
+        misses.set(code, time.monotonic() + get_setting('MISS_TTL'))
+    else:
+        links.set(code, link)
+    return link
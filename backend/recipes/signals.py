@@ -0,0 +1,28 @@
+"""
+Сброс кэша серверной страницы рецепта (recipes.sharepages) после
+коммита изменения рецепта, в том числе из админки. Продукты рецепта
+через API пишутся отдельно — их сохранение сбрасывает кэш само
+(RecipeCreateUpdateSerializer._save_ingredients).
+
+После удаления рецепта или короткой ссылки сбрасываются кэши кодов
+коротких ссылок (recipes.shortlinks).
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import shortlinks
+from .models import Recipe, ShortLink
+from .sharepages import invalidate
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: invalidate(recipe_id))
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=ShortLink)
+def short_link_deleted(sender, instance, **kwargs):
+    transaction.on_commit(shortlinks.invalidate)
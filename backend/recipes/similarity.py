@@ -0,0 +1,72 @@
+"""
+Поиск похожих рецептов по MinHash LSH-индексу.
+"""
+from functools import reduce
+import operator
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .minhash import band_hashes, jaccard, signature
+from .models import RecipeBucket, RecipeIngredient, RecipeSignature
+
+# Сколько кандидатов с наибольшим числом общих полос проверять точно.
+MAX_CANDIDATES = 500
+
+
+def update_signature(recipe_id, ingredient_ids):
+    """
+    Пересчитать сигнатуру и корзины рецепта после смены ингредиентов.
+    """
+    sig = signature(ingredient_ids)
+    with transaction.atomic():
+        RecipeSignature.objects.update_or_create(
+            recipe_id=recipe_id,
+            defaults={'minhash': sig.tobytes()}
+        )
+        RecipeBucket.objects.filter(recipe_id=recipe_id).delete()
+        RecipeBucket.objects.bulk_create(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(band_hashes(sig))
+        )
+
+
+def similar_recipes(recipe_id, limit):
+    """
+    До limit пар (recipe_id, jaccard) для рецептов, похожих на данный,
+    по убыванию точного коэффициента Жаккара.
+
+    Кандидаты берутся только из совпавших LSH-корзин (индекс
+    band + bucket), поэтому полного просмотра рецептов нет.
+    """
+    buckets = RecipeBucket.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('band', 'bucket')
+    conditions = [Q(band=band, bucket=bucket) for band, bucket in buckets]
+    if not conditions:
+        return []
+
+    candidates = list(
+        RecipeBucket.objects.filter(reduce(operator.or_, conditions))
+        .exclude(recipe_id=recipe_id)
+        .values('recipe_id')
+        .annotate(shared=Count('id'))
+        .order_by('-shared')
+        .values_list('recipe_id', flat=True)[:MAX_CANDIDATES]
+    )
+    if not candidates:
+        return []
+
+    sets = {}
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=[recipe_id, *candidates]
+    ).values_list('recipe_id', 'ingredient_id')
+    for pk, ingredient_id in rows:
+        sets.setdefault(pk, set()).add(ingredient_id)
+
+    own = sets.pop(recipe_id, set())
+    scored = sorted(
+        ((pk, jaccard(own, ingredients)) for pk, ingredients in sets.items()),
+        key=lambda item: (-item[1], -item[0])
+    )
+    return [item for item in scored if item[1] > 0][:limit]
@@ -0,0 +1,102 @@
+"""
+Статистика авторов: инкрементальные суточные агрегаты.
+
+Пути записи (создание и удаление рецептов, избранное, список покупок,
+подписки) вызывают track(), который прибавляет приращение к строке
+автора за текущий день. Чтение статистики — два индексных запроса
+по автору, без обращения к Favorite и ShoppingCart.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AuthorDailyStats, AuthorIngredientStats
+
+TOP_INGREDIENTS = 10
+
+FIELDS = ('recipes', 'favorites', 'carts', 'followers')
+
+
+def track(author_id, **deltas):
+    """
+    Прибавить приращения к статистике автора за сегодня:
+    track(author.id, favorites=1)
+    """
+    day = timezone.localdate()
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    stats = AuthorDailyStats.objects.filter(author_id=author_id, day=day)
+    if stats.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            AuthorDailyStats.objects.create(
+                author_id=author_id, day=day, **deltas
+            )
+    except IntegrityError:
+        # Строку за сегодня успел создать параллельный запрос.
+        stats.update(**changes)
+
+
+def track_ingredients(author_id, old_ids, new_ids):
+    """
+    Учесть смену набора продуктов в рецепте автора.
+    """
+    old_ids, new_ids = set(old_ids), set(new_ids)
+    removed, added = old_ids - new_ids, new_ids - old_ids
+    stats = AuthorIngredientStats.objects.filter(author_id=author_id)
+    if removed:
+        stats.filter(
+            ingredient_id__in=removed, recipes__gt=0
+        ).update(recipes=F('recipes') - 1)
+    if not added:
+        return
+    # Сначала строки с нулём для новых продуктов, потом +1 всем:
+    # строку, которую успел вставить параллельный запрос, вставка
+    # пропустит, а прибавка учтёт оба рецепта.
+    AuthorIngredientStats.objects.bulk_create(
+        (
+            AuthorIngredientStats(
+                author_id=author_id, ingredient_id=ingredient_id, recipes=0
+            )
+            for ingredient_id in added
+        ),
+        ignore_conflicts=True
+    )
+    stats.filter(ingredient_id__in=added).update(recipes=F('recipes') + 1)
+
+
+def author_stats(author_id):
+    """
+    Итоги, накопительная история по дням и самые частые продукты.
+    """
+    totals = dict.fromkeys(FIELDS, 0)
+    history = []
+    for row in AuthorDailyStats.objects.filter(
+        author_id=author_id
+    ).values('day', *FIELDS):
+        for field in FIELDS:
+            totals[field] += row[field]
+        history.append({'day': row['day'], **totals})
+
+    top_ingredients = [
+        {
+            'id': item.ingredient.id,
+            'name': item.ingredient.name,
+            'measurement_unit': item.ingredient.measurement_unit,
+            'recipes': item.recipes,
+        }
+        for item in AuthorIngredientStats.objects.filter(
+            author_id=author_id, recipes__gt=0
+        ).select_related('ingredient').order_by(
+            '-recipes'
+        )[:TOP_INGREDIENTS]
+    ]
+
+    return {
+        'recipes_count': totals['recipes'],
+        'favorites_count': totals['favorites'],
+        'carts_count': totals['carts'],
+        'followers_count': totals['followers'],
+        'history': history,
+        'top_ingredients': top_ingredients,
+    }
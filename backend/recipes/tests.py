@@ -0,0 +1,144 @@
+from io import StringIO
+import os
+import random
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.test import TestCase
+
+from . import fakedata
+from .minhash import jaccard
+from . import shortlinks
+from .models import Recipe, RecipeIngredient
+from .similarity import similar_recipes
+
+
+class SimilarRecipesRecallTest(TestCase):
+    """
+    Полнота LSH-поиска похожих рецептов относительно точного
+    перебора по коэффициенту Жаккара.
+
+    К набору fakedata.seed() добавляются варианты части рецептов
+    с одним заменённым продуктом — иначе у случайных наборов почти
+    нет пар выше порога LSH.
+    """
+    LIMIT = 6
+    # Пары с J ниже порога индекс находит лишь с заметной вероятностью
+    # (около 0.5 при BANDS=16, ROWS=4), их полнота не проверяется.
+    MIN_JACCARD = 0.6
+    MIN_RECALL = 0.9
+    VARIANTS = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        data = fakedata.seed(scale=8)
+        rng = random.Random(1)
+        recipes = cls.ingredient_sets()
+        # Вторая половина рецептов — варианты рецептов первой.
+        originals = sorted(recipes)[:len(recipes) // 2]
+        copies = sorted(recipes)[len(recipes) // 2:]
+        RecipeIngredient.objects.filter(recipe_id__in=copies).delete()
+        rows = []
+        for number, recipe_id in enumerate(copies):
+            source = recipes[originals[number // cls.VARIANTS]]
+            ingredients = set(source)
+            ingredients.remove(rng.choice(sorted(ingredients)))
+            ingredients.add(rng.choice([
+                pk for pk in data['ingredients'] if pk not in source
+            ]))
+            rows += [
+                RecipeIngredient(
+                    recipe_id=recipe_id, ingredient_id=pk, amount=1
+                )
+                for pk in ingredients
+            ]
+        RecipeIngredient.objects.bulk_create(rows)
+        call_command(
+            'rebuild_similarity_index', processes=1, stdout=StringIO()
+        )
+
+    @staticmethod
+    def ingredient_sets():
+        recipes = {}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ):
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+        return recipes
+
+    def test_recall_against_exact_jaccard(self):
+        recipes = self.ingredient_sets()
+        expected_total = found_total = 0
+        for recipe_id, own in recipes.items():
+            exact = sorted(
+                (
+                    (pk, jaccard(own, ingredients))
+                    for pk, ingredients in recipes.items()
+                    if pk != recipe_id
+                ),
+                key=lambda item: (-item[1], -item[0])
+            )[:self.LIMIT]
+            expected = {
+                pk for pk, score in exact if score >= self.MIN_JACCARD
+            }
+            found = {
+                pk for pk, _ in similar_recipes(recipe_id, self.LIMIT)
+            }
+            expected_total += len(expected)
+            found_total += len(expected & found)
+        self.assertGreater(expected_total, 100)
+        self.assertGreaterEqual(
+            found_total / expected_total, self.MIN_RECALL,
+            f'найдено {found_total} из {expected_total} похожих рецептов'
+        )
+
+
+class ShortLinkCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe_id = fakedata.seed()['recipes'][0]
+
+    def setUp(self):
+        cache.clear()
+        shortlinks.invalidate()
+
+    def test_deleted_recipe_is_evicted(self):
+        code = shortlinks.get_or_create_link(self.recipe_id).code
+        self.assertEqual(shortlinks.resolve(code)[1], self.recipe_id)
+        with self.assertNumQueries(0):
+            shortlinks.resolve(code)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=self.recipe_id).delete()
+        self.assertIsNone(shortlinks.resolve(code))
+
+    def test_unknown_code_is_cached(self):
+        self.assertIsNone(shortlinks.resolve('zzzzzz'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(shortlinks.resolve('zzzzzz'))
+
+
+class ImportDataTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        fakedata.seed()
+
+    def test_reimport_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.ndjson')
+            call_command('export_data', output=path, stderr=StringIO())
+            out = StringIO()
+            call_command('import_data', path, stdout=out)
+        written = next(
+            line for line in out.getvalue().splitlines()
+            if line.startswith('Записано: ')
+        )
+        for part in written[len('Записано: '):].split(', '):
+            with self.subTest(part):
+                self.assertEqual(part.rsplit(' ', 1)[1], '0')
+
+    def test_missing_input(self):
+        with self.assertRaises(CommandError):
+            call_command('import_data', '/nonexistent.ndjson')
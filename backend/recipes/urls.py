@@ -4,7 +4,7 @@ from .views import redirect_short_link
 
 urlpatterns = [
     path(
-        's/<str:recipe_id>/',
+        's/<str:code>/',
         redirect_short_link,
         name='short-link-redirect'
     ),
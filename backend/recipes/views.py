@@ -1,10 +1,28 @@
-from rest_framework.decorators import api_view
-from django.shortcuts import redirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import patch_vary_headers
 
+from .sharepages import get_setting, render_share_page, wants_share_page
+from .shortlinks import hits, resolve
 
-@api_view(['GET'])
-def redirect_short_link(request, recipe_id):
+
+def redirect_short_link(request, code):
     """
-    Переход с короткой ссылки на страницу рецепта.
+    Переход с короткой ссылки на страницу рецепта. Обычное
+    представление Django, без DRF: в горячем пути только LRU.
+    Краулерам и превью мессенджеров — серверная страница рецепта.
     """
-    return redirect(f'/recipes/{recipe_id}/')
+    link = resolve(code)
+    if link is None:
+        raise Http404('Короткая ссылка не найдена.')
+    link_id, recipe_id = link
+    hits.add(link_id)
+    page = render_share_page(request, recipe_id) if wants_share_page(
+        request
+    ) else None
+    if page is None:
+        response = HttpResponseRedirect(f'/recipes/{recipe_id}/')
+    else:
+        response = HttpResponse(page)
+    if not get_setting('FOR_ALL'):
+        patch_vary_headers(response, ('User-Agent',))
+    return response
@@ -0,0 +1,17 @@
+"""
+Инициализация дочерних процессов пула, которым нужен ORM.
+
+Модуль нарочно не импортирует ничего из Django на верхнем уровне:
+процесс, запущенный через spawn, импортирует его до django.setup().
+"""
+import django
+from django.utils.module_loading import import_string
+
+
+def setup(target, *args):
+    """
+    Настроить Django в дочернем процессе и вызвать target(*args),
+    где target — путь к функции вида 'recipes.fakedata.init_worker'.
+    """
+    django.setup()
+    import_string(target)(*args)